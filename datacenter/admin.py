@@ -11,7 +11,8 @@ from .models import (
     Question,
     Subscription,
     Donation,
-    Notification
+    Notification,
+    UserNotification
 )
 
 
@@ -49,19 +50,15 @@ class EventAdmin(admin.ModelAdmin):
         )
 
     def program_change_view(self, request, object_id):
-        from tg_bot.notifications import get_notification_service
+        from tg_bot.notifications import enqueue_program_change_notification
         
         event = Event.objects.get(id=object_id)
         
         if request.method == 'POST':
             change_description = request.POST.get('change_description', '')
             if change_description:
-                notification_service = get_notification_service()
-                if not notification_service:
-                    messages.error(request, "Telegram бот не настроен. Уведомления недоступны.")
-                    return HttpResponseRedirect("/admin/datacenter/event/")
-                sent_count = notification_service.send_program_change_notification(event, change_description)
-                messages.success(request, f"Уведомление отправлено {sent_count} подписчикам")
+                enqueue_program_change_notification(event, change_description)
+                messages.success(request, "Уведомление поставлено в очередь на отправку подписчикам")
                 return HttpResponseRedirect("/admin/datacenter/event/")
             else:
                 messages.error(request, "Пожалуйста, введите описание изменений")
@@ -75,35 +72,23 @@ class EventAdmin(admin.ModelAdmin):
         return render(request, 'admin/program_change_notification.html', context)
 
     def send_new_event_notification(self, request, queryset):
-        from tg_bot.notifications import get_notification_service
+        from tg_bot.notifications import enqueue_new_event_notification
         
-        notification_service = get_notification_service()
-        if not notification_service:
-            self.message_user(request, "Telegram бот не настроен. Уведомления недоступны.", level='error')
-            return
-        
-        sent_count = 0
         for event in queryset:
-            count = notification_service.send_new_event_notification(event)
-            sent_count += count
-            self.message_user(request, f"Уведомления о мероприятии '{event.title}' отправлены {count} пользователям")
+            enqueue_new_event_notification(event)
+            self.message_user(request, f"Уведомления о мероприятии '{event.title}' поставлены в очередь на отправку")
     send_new_event_notification.short_description = "Отправить уведомление о новом мероприятии"
 
     def send_reminder_notification(self, request, queryset):
-        from tg_bot.notifications import get_notification_service
+        from tg_bot.notifications import enqueue_reminder_notification
         
         if queryset.count() != 1:
             self.message_user(request, "Пожалуйста, выберите только одно мероприятие.", level='error')
             return
 
-        notification_service = get_notification_service()
-        if not notification_service:
-            self.message_user(request, "Telegram бот не настроен. Уведомления недоступны.", level='error')
-            return
-
         event = queryset.first()
-        count = notification_service.send_reminder_notification(event)
-        self.message_user(request, f"Напоминания о мероприятии '{event.title}' отправлены {count} пользователям")
+        enqueue_reminder_notification(event)
+        self.message_user(request, f"Напоминания о мероприятии '{event.title}' поставлены в очередь на отправку")
     send_reminder_notification.short_description = "Отправить напоминание о мероприятии"
 
     def get_urls(self):
@@ -129,7 +114,7 @@ class SpeakerAdmin(admin.ModelAdmin):
             'fields': ('name',)
         }),
         ('Telegram', {
-            'fields': ('telegram_id',)
+            'fields': ('telegram_id', 'questions_push_enabled')
         }),
     )
 
@@ -160,18 +145,11 @@ class SpeechAdmin(admin.ModelAdmin):
     )
 
     def send_speech_reminder(self, request, queryset):
-        from tg_bot.notifications import get_notification_service
+        from tg_bot.notifications import enqueue_reminder_notification
         
-        notification_service = get_notification_service()
-        if not notification_service:
-            self.message_user(request, "Telegram бот не настроен. Уведомления недоступны.", level='error')
-            return
-        
-        sent_count = 0
-        for speech in queryset:
-            count = notification_service.send_reminder_notification(speech.event, speech)
-            sent_count += count
-            self.message_user(request, f"Напоминания о выступлении '{speech.title}' отправлены {count} пользователям")
+        for speech in queryset.select_related('event', 'speaker'):
+            enqueue_reminder_notification(speech.event, speech)
+            self.message_user(request, f"Напоминания о выступлении '{speech.title}' поставлены в очередь на отправку")
     send_speech_reminder.short_description = "Отправить напоминание о выступлении"
 
 
@@ -179,7 +157,7 @@ class SpeechAdmin(admin.ModelAdmin):
 class ParticipantAdmin(admin.ModelAdmin):
     list_display = ('get_display_name', 'telegram_id', 'company', 'position', 'questions_count', 'registered_at')
     search_fields = ('full_name', 'username', 'company')
-    list_filter = ('experience', 'registered_at')
+    list_filter = ('experience', 'registered_at', 'bot_blocked')
     date_hierarchy = 'registered_at'
     actions = ['export_telegram_ids']
 
@@ -206,7 +184,7 @@ class ParticipantAdmin(admin.ModelAdmin):
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('get_short_text', 'participant', 'speech', 'created_at', 'is_answered')
+    list_display = ('get_short_text', 'participant', 'speech', 'votes', 'created_at', 'is_answered')
     list_filter = ('is_answered', 'speech', 'created_at')
     search_fields = ('question_text', 'participant__full_name')
     date_hierarchy = 'created_at'
@@ -244,11 +222,32 @@ class DonationAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('title', 'event', 'notification_type', 'is_sent', 'created_at')
-    list_filter = ('notification_type', 'is_sent', 'created_at', 'event')
+    list_display = ('title', 'event', 'notification_type', 'status', 'progress', 'created_at')
+    list_filter = ('notification_type', 'status', 'created_at', 'event')
     search_fields = ('title', 'message')
     date_hierarchy = 'created_at'
-    readonly_fields = ('created_at',)
+    readonly_fields = (
+        'created_at', 'status', 'sent_count', 'total_recipients', 'cursor', 'heartbeat_at',
+        'attempts', 'last_error',
+    )
     
     def has_add_permission(self, request):
         return False
+
+    def progress(self, obj):
+        if obj.total_recipients is None:
+            return '—'
+        return f"{obj.sent_count} / {obj.total_recipients}"
+    progress.short_description = 'Доставлено'
+
+
+@admin.register(UserNotification)
+class UserNotificationAdmin(admin.ModelAdmin):
+    list_display = ('participant', 'notification', 'status', 'attempts', 'received_at')
+    list_filter = ('status', 'received_at')
+    search_fields = ('participant__full_name', 'participant__username', 'error')
+    date_hierarchy = 'received_at'
+    readonly_fields = ('participant', 'notification', 'status', 'attempts', 'error', 'received_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -1,9 +1,16 @@
 import logging
+import signal
+import threading
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from telegram.ext import Updater
 
-from tg_bot.config import TELEGRAM_BOT_TOKEN
 from tg_bot.common import register_common_handlers
+from tg_bot.persistence import DatabasePersistence
+from tg_bot.questions import get_question_buffer, start_speaker_digests
+from tg_bot.ratelimit import build_bot
+from tg_bot.votes import get_vote_counter
+from tg_bot.webhook import WebhookUpdateFeed
 
 
 logger = logging.getLogger(__name__)
@@ -12,25 +19,95 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Run the Telegram bot'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--webhook',
+            action='store_true',
+            help='Receive updates through the Django app webhook instead of long polling',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write("Запуск телеграм бота...")
         
         try:
-            updater = Updater(token=TELEGRAM_BOT_TOKEN, use_context=True)
+            # Все reply_text идут через bot.send_message, а значит и через лимитер
+            # Пул соединений на 4 потока диспетчера и служебные запросы Updater
+            bot = build_bot(con_pool_size=8, role="bot")
+            if options['webhook'] and not self.set_webhook(bot):
+                return
+            # user_data переживает перезапуск: состояния диалогов лежат в БД
+            persistence = DatabasePersistence(
+                flush_interval=settings.BOT_SETTINGS["conversation_flush_seconds"],
+            )
+            updater = Updater(bot=bot, use_context=True, persistence=persistence)
+            persistence.start()
             dispatcher = updater.dispatcher
 
             register_common_handlers(dispatcher)
+            # Сразу дописываем в БД вопросы, оставшиеся в журнале после прошлого запуска
+            question_buffer = get_question_buffer()
+            digest_pusher = start_speaker_digests(bot)
 
             logger.info("Бот запускается...")
             self.stdout.write(
                 self.style.SUCCESS("Бот запущен. Нажми Ctrl+C для остановки.")
             )
             
-            updater.start_polling()
-            updater.idle()
+            try:
+                if options['webhook']:
+                    self.run_webhook_feed(dispatcher)
+                else:
+                    updater.start_polling()
+                    updater.idle()
+            finally:
+                self.stop_services(
+                    question_buffer.stop,
+                    digest_pusher.stop,
+                    get_vote_counter().stop,
+                    persistence.stop,
+                )
             
         except Exception as e:
             logger.error(f"Error starting bot: {e}")
             self.stdout.write(
                 self.style.ERROR(f"Ошибка при запуске бота: {e}")
             )
+
+    def stop_services(self, *stops):
+        """Останавливает фоновые части по очереди: ошибка одной не мешает остальным дописать данные."""
+        for stop in stops:
+            try:
+                stop()
+            except Exception as e:
+                logger.error(f"Error stopping {type(stop.__self__).__name__}: {e}")
+
+    def set_webhook(self, bot):
+        webhook_url = settings.TELEGRAM_SETTINGS["webhook_url"]
+        secret = settings.TELEGRAM_SETTINGS["webhook_secret"]
+        if not webhook_url or not secret:
+            self.stdout.write(
+                self.style.ERROR("Для webhook нужны TELEGRAM_WEBHOOK_URL и TELEGRAM_WEBHOOK_SECRET")
+            )
+            return False
+
+        # Telegram начнёт слать апдейты на Django-приложение, long polling после этого не нужен
+        bot.set_webhook(url=webhook_url, secret_token=secret)
+        self.stdout.write(f"Webhook установлен: {webhook_url}")
+        return True
+
+    def run_webhook_feed(self, dispatcher):
+        """Апдейты принимает веб-приложение, а обрабатывает этот процесс, забирая их из БД."""
+        feed = WebhookUpdateFeed(
+            dispatcher,
+            poll_interval=settings.BOT_SETTINGS["webhook_poll_interval_ms"] / 1000,
+            idle_poll_interval=settings.BOT_SETTINGS["webhook_idle_poll_interval_ms"] / 1000,
+            batch_size=settings.BOT_SETTINGS["webhook_batch_size"],
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: feed.stop())
+
+        threading.Thread(target=dispatcher.start, name="dispatcher", daemon=True).start()
+        feed.run()
+        # Диспетчер останавливается, только разобрав очередь до конца
+        dispatcher.stop()
+        feed.delete_processed(everything=True)
@@ -0,0 +1,42 @@
+import logging
+import signal
+import sys
+from django.core.management.base import BaseCommand
+
+from tg_bot.broadcasts import run_worker
+from tg_bot.notifications import get_notification_service
+from tg_bot.reminders import start_reminder_scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run the notification broadcast worker'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Запуск рассылки уведомлений...")
+
+        notification_service = get_notification_service()
+        if not notification_service:
+            self.stdout.write(
+                self.style.ERROR("Telegram бот не настроен. Рассылка невозможна.")
+            )
+            return
+
+        start_reminder_scheduler()
+
+        self.stdout.write(
+            self.style.SUCCESS("Рассылка запущена. Нажми Ctrl+C для остановки.")
+        )
+
+        # SIGTERM при деплое превращаем в обычный выход, чтобы отработал finally
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        try:
+            run_worker(notification_service)
+        except KeyboardInterrupt:
+            self.stdout.write("Рассылка остановлена.")
+        finally:
+            # Дописываем в БД накопленные записи о доставке
+            notification_service.close()
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-17 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_notifications_sent(apps, schema_editor):
+    # Старые уведомления рассылались синхронно, повторно их отправлять нельзя
+    Notification = apps.get_model("datacenter", "Notification")
+    Notification.objects.update(status="sent")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0007_alter_notification_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="sent_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="speech",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="datacenter.speech",
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "В очереди"),
+                    ("processing", "Отправляется"),
+                    ("sent", "Отправлено"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(
+            mark_existing_notifications_sent, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+
+def mark_existing_deliveries_sent(apps, schema_editor):
+    # Раньше записи создавались только после успешной отправки
+    UserNotification = apps.get_model("datacenter", "UserNotification")
+    UserNotification.objects.update(status="sent", attempts=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0008_notification_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="participant",
+            name="bot_blocked",
+            field=models.BooleanField(default=False, verbose_name="Заблокировал бота"),
+        ),
+        migrations.AddField(
+            model_name="usernotification",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="usernotification",
+            name="error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="usernotification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает отправки"),
+                    ("sent", "Доставлено"),
+                    ("failed", "Ошибка"),
+                    ("blocked", "Бот заблокирован"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(mark_existing_deliveries_sent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0009_delivery_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="cursor",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="total_recipients",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 01:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0010_broadcast_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="uid",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
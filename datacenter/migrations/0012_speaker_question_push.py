@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0011_question_buffer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="speaker",
+            name="last_pushed_question_id",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="speaker",
+            name="questions_push_enabled",
+            field=models.BooleanField(
+                default=False, verbose_name="Присылать новые вопросы"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0012_speaker_question_push"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["speech", "created_at"], name="datacenter__speech__284b0a_idx"
+            ),
+        ),
+    ]
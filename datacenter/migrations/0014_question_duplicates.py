@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-17 01:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0013_question_speech_created_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicates",
+                to="datacenter.question",
+            ),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="duplicates_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
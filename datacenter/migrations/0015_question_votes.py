@@ -0,0 +1,62 @@
+# Generated by Django 5.2 on 2026-10-17 01:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0014_question_duplicates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionVote",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("telegram_id", models.BigIntegerField()),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Голос за вопрос",
+                "verbose_name_plural": "Голоса за вопросы",
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="question",
+            name="datacenter__speech__284b0a_idx",
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="votes",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["speech", "-votes", "created_at"],
+                name="datacenter__speech__fe11ad_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="questionvote",
+            name="question",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="datacenter.question"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="questionvote",
+            unique_together={("question", "telegram_id")},
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 01:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0015_question_votes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NetworkingSeen",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seen_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "candidate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="datacenter.participant",
+                    ),
+                ),
+                (
+                    "viewer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="networking_seen",
+                        to="datacenter.participant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Просмотренная анкета",
+                "verbose_name_plural": "Просмотренные анкеты",
+                "unique_together": {("viewer", "candidate")},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-17 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0016_networking_seen"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="participant",
+            name="networking_waiting",
+            field=models.BooleanField(
+                db_index=True, default=False, verbose_name="Ждёт анкет для нетворкинга"
+            ),
+        ),
+    ]
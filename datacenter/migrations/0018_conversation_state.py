@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0017_networking_waitlist"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConversationState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("telegram_id", models.BigIntegerField(unique=True)),
+                ("data", models.TextField(default="{}")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Состояние диалога",
+                "verbose_name_plural": "Состояния диалогов",
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0019_notification_attempts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usernotification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("sent", "Доставлено"),
+                    ("failed", "Ошибка"),
+                    ("blocked", "Бот заблокирован"),
+                ],
+                db_index=True,
+                default="sent",
+                max_length=20,
+            ),
+        ),
+    ]
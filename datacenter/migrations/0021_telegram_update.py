@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datacenter", "0020_user_notification_without_pending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TelegramUpdate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("update_id", models.BigIntegerField(unique=True)),
+                ("payload", models.TextField()),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Апдейт Telegram",
+                "verbose_name_plural": "Апдейты Telegram",
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.dispatch import receiver
@@ -29,28 +29,28 @@ class Event(models.Model):
         return self.title
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-
-        if not is_new:
-            old_event = Event.objects.get(pk=self.pk)
-            important_fields_changed = (
-                old_event.title != self.title or
-                old_event.date != self.date
-            )
-        else:
-            important_fields_changed = True
-
-        super().save(*args, **kwargs)
-
-        if important_fields_changed:
-            from tg_bot.notifications import get_notification_service
-            notification_service = get_notification_service()
-            if notification_service:
+        # Изменение и уведомление о нём (outbox) фиксируются одной транзакцией
+        with transaction.atomic():
+            is_new = self.pk is None
+
+            if not is_new:
+                old_event = Event.objects.get(pk=self.pk)
+                important_fields_changed = (
+                    old_event.title != self.title or
+                    old_event.date != self.date
+                )
+            else:
+                important_fields_changed = True
+
+            super().save(*args, **kwargs)
+
+            if important_fields_changed:
+                from tg_bot.notifications import enqueue_program_change_notification
                 if is_new:
                     change_description = f"Добавлено новое мероприятие '{self.title}'. Проверьте актуальное расписание."
                 else:
                     change_description = f"Изменения в мероприятии '{self.title}'. Проверьте актуальное расписание."
-                notification_service.send_program_change_notification(self, change_description)
+                enqueue_program_change_notification(self, change_description)
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
@@ -59,6 +59,9 @@ class Event(models.Model):
 class Speaker(models.Model):
     name = models.CharField('Имя', max_length=255)
     telegram_id = models.BigIntegerField(null=True, blank=True)
+    questions_push_enabled = models.BooleanField('Присылать новые вопросы', default=False)
+    # id последнего вопроса, который уже ушёл спикеру в дайджесте
+    last_pushed_question_id = models.BigIntegerField(default=0, editable=False)
 
     @property
     def speeches_count(self):
@@ -91,30 +94,30 @@ class Speech(models.Model):
         return f'{self.title} - {self.speaker.name}'
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-
-        if not is_new:
-            old_speech = Speech.objects.get(pk=self.pk)
-            important_fields_changed = (
-                old_speech.title != self.title or
-                old_speech.start_time != self.start_time or
-                old_speech.end_time != self.end_time or
-                old_speech.speaker_id != self.speaker_id
-            )
-        else:
-            important_fields_changed = True
-
-        super().save(*args, **kwargs)
-
-        if important_fields_changed:
-            from tg_bot.notifications import get_notification_service
-            notification_service = get_notification_service()
-            if notification_service:
+        # Изменение и уведомление о нём (outbox) фиксируются одной транзакцией
+        with transaction.atomic():
+            is_new = self.pk is None
+
+            if not is_new:
+                old_speech = Speech.objects.get(pk=self.pk)
+                important_fields_changed = (
+                    old_speech.title != self.title or
+                    old_speech.start_time != self.start_time or
+                    old_speech.end_time != self.end_time or
+                    old_speech.speaker_id != self.speaker_id
+                )
+            else:
+                important_fields_changed = True
+
+            super().save(*args, **kwargs)
+
+            if important_fields_changed:
+                from tg_bot.notifications import enqueue_program_change_notification
                 if is_new:
                     change_description = f"Добавлено новое выступление '{self.title}'. Проверьте актуальное расписание."
                 else:
                     change_description = f"Изменения в выступлении '{self.title}'. Проверьте актуальное расписание."
-                notification_service.send_program_change_notification(self.event, change_description)
+                enqueue_program_change_notification(self.event, change_description)
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
@@ -128,6 +131,9 @@ class Participant(models.Model):
     position = models.CharField(max_length=255, blank=True)
     experience = models.CharField(max_length=100, blank=True)
     registered_at = models.DateTimeField(auto_now_add=True)
+    bot_blocked = models.BooleanField('Заблокировал бота', default=False)
+    # Анкет для знакомства не нашлось: пришлём, когда появится подходящая
+    networking_waiting = models.BooleanField('Ждёт анкет для нетворкинга', default=False, db_index=True)
 
     looking_for = models.CharField(
         max_length=255,
@@ -154,15 +160,71 @@ class Participant(models.Model):
             return f"Participant {self.telegram_id}"
 
 
+# Состояние диалога пользователя с ботом (context.user_data), переживает перезапуск
+class ConversationState(models.Model):
+    telegram_id = models.BigIntegerField(unique=True)
+    data = models.TextField(default='{}')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Состояние диалога'
+        verbose_name_plural = 'Состояния диалогов'
+
+    def __str__(self):
+        return f"Conversation {self.telegram_id}"
+
+
+# Апдейт Telegram, который принял webhook веб-приложения и ещё не забрал runbot
+class TelegramUpdate(models.Model):
+    update_id = models.BigIntegerField(unique=True)
+    payload = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Апдейт Telegram'
+        verbose_name_plural = 'Апдейты Telegram'
+
+    def __str__(self):
+        return f"Update {self.update_id}"
+
+
+# Анкета, которую участник уже видел в нетворкинге: больше её не показываем
+class NetworkingSeen(models.Model):
+    viewer = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='networking_seen')
+    candidate = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='+')
+    seen_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['viewer', 'candidate']
+        verbose_name = 'Просмотренная анкета'
+        verbose_name_plural = 'Просмотренные анкеты'
+
+    def __str__(self):
+        return f"{self.viewer_id} → {self.candidate_id}"
+
+
 class Question(models.Model):
     speech = models.ForeignKey(Speech, on_delete=models.CASCADE)
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     question_text = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Время, когда вопрос задали, а не когда его записали в БД из буфера
+    created_at = models.DateTimeField(default=timezone.now)
     is_answered = models.BooleanField(default=False)
+    # Ключ идемпотентности: повторная запись из журнала буфера не создаёт дубль
+    uid = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    # Почти такой же вопрос, заданный раньше; спикер видит только представителя с числом похожих
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates'
+    )
+    duplicates_count = models.PositiveIntegerField(default=0)
+    votes = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ('speech',)
+        indexes = [
+            # Постраничный просмотр вопросов спикером по ключу (votes, created_at, id)
+            models.Index(fields=['speech', '-votes', 'created_at']),
+        ]
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
 
@@ -170,6 +232,21 @@ class Question(models.Model):
         return f"Question to {self.speech.title}: {self.question_text[:50]}..."
 
 
+class QuestionVote(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # Голосовать можно и без профиля участника, поэтому храним только telegram_id
+    telegram_id = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['question', 'telegram_id']
+        verbose_name = 'Голос за вопрос'
+        verbose_name_plural = 'Голоса за вопросы'
+
+    def __str__(self):
+        return f"{self.telegram_id} → {self.question_id}"
+
+
 class Subscription(models.Model):
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
@@ -208,21 +285,51 @@ class Notification(models.Model):
         ('reminder', 'Напоминание'),
         ('general', 'Общее уведомление'),
     ]
+    STATUSES = [
+        ('pending', 'В очереди'),
+        ('processing', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Не удалось отправить'),
+    ]
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    speech = models.ForeignKey(Speech, on_delete=models.SET_NULL, null=True, blank=True)
     title = models.CharField(max_length=255)
     message = models.TextField()
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES, default='general')
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending', db_index=True)
+    sent_count = models.IntegerField(default=0)
+    total_recipients = models.IntegerField(null=True, blank=True)
+    # id последнего участника из полностью разосланной пачки
+    cursor = models.BigIntegerField(default=0)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # Сколько раз воркер брался за рассылку и последняя ошибка
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
     is_sent = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     scheduled_for = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+
     def __str__(self):
         return f"{self.title} ({self.created_at.strftime('%d.%m.%Y %H:%M')})"
 
 
 class UserNotification(models.Model):
+    # Запись появляется только с итогом отправки, поэтому состояния «в очереди» нет
+    STATUSES = [
+        ('sent', 'Доставлено'),
+        ('failed', 'Ошибка'),
+        ('blocked', 'Бот заблокирован'),
+    ]
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUSES, default='sent', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
     is_read = models.BooleanField(default=False)
     received_at = models.DateTimeField(auto_now_add=True)
 
@@ -1,10 +1,43 @@
-from django.db.models.signals import pre_delete
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from .models import Speech
+from .models import Event, Speaker, Speech
 
 @receiver(pre_delete, sender=Speech)
-def speech_pre_delete(sender, instance, **kwargs):
-    from tg_bot.notifications import get_notification_service
-    notification_service = get_notification_service()
+def speech_pre_delete(sender, instance, origin=None, **kwargs):
+    # Мероприятие удаляется целиком вместе с выступлениями — уведомлять не о чем
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is Event:
+        return
+
+    from tg_bot.notifications import enqueue_program_change_notification
     change_description = f"Выступление '{instance.title}' было удалено из программы."
-    notification_service.send_program_change_notification(instance.event, change_description)
+    enqueue_program_change_notification(instance.event, change_description)
+
+
+@receiver(post_save, sender=Speech)
+@receiver(post_delete, sender=Speech)
+def speech_changed(sender, instance, **kwargs):
+    from tg_bot.program import invalidate_program
+    from tg_bot.reminders import notify_event_changed
+    event_id = instance.event_id
+    transaction.on_commit(invalidate_program)
+    transaction.on_commit(lambda: notify_event_changed(event_id))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    from tg_bot.program import invalidate_program
+    from tg_bot.reminders import notify_event_changed
+    event_id = instance.id
+    transaction.on_commit(invalidate_program)
+    transaction.on_commit(lambda: notify_event_changed(event_id))
+
+
+@receiver(post_save, sender=Speaker)
+def speaker_changed(sender, instance, **kwargs):
+    # Имя спикера выводится в программе
+    from tg_bot.program import invalidate_program
+    transaction.on_commit(invalidate_program)
@@ -1,3 +1,441 @@
-from django.test import TestCase
+import json
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from queue import Queue
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from telegram import Bot
+from telegram.ext import Dispatcher
+
+from datacenter.models import Event, Notification, Participant, Question, Speaker, Speech, TelegramUpdate, UserNotification
+from tg_bot.clustering import SIMILARITY_THRESHOLD, QuestionClusterer, minhash, similarity
+from tg_bot.matching import MatchEngine
+from tg_bot.notifications import NotificationService
+from tg_bot import program
+from tg_bot.program import SpeechIntervalIndex, get_program, invalidate_program
+from tg_bot.ratelimit import RateLimiter, TokenBucket, _reset_rate_limiter, get_rate_limiter
+from tg_bot.talks import _fetch_questions_page, _parse_questions_cursor_data, _questions_cursor_data
+from tg_bot.votes import VoteCounter
+from tg_bot.webhook import WebhookUpdateFeed
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_is_free_then_spaced_by_rate(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        now = bucket.updated_at
+        waits = [bucket.reserve(now) for _ in range(5)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 0.1)
+        self.assertAlmostEqual(waits[4], 0.2)
+
+    def test_refills_over_time_up_to_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        now = bucket.updated_at
+        for _ in range(3):
+            bucket.reserve(now)
+        self.assertFalse(bucket.is_idle(now))
+        self.assertEqual(bucket.reserve(now + 10), 0)
+        self.assertTrue(bucket.is_idle(now + 20))
+
+
+class RateLimiterTests(SimpleTestCase):
+    def acquire_all(self, limiter, chat_ids, now=100.0):
+        waits = []
+        with mock.patch('tg_bot.ratelimit.time') as fake_time:
+            fake_time.monotonic.return_value = now
+            fake_time.sleep.side_effect = waits.append
+            for chat_id in chat_ids:
+                limiter.acquire(chat_id)
+        return waits
+
+    def make_limiter(self):
+        with mock.patch('tg_bot.ratelimit.time.monotonic', return_value=100.0):
+            return RateLimiter(global_rate=10, global_burst=2, chat_rate=1, chat_burst=1)
+
+    def test_global_limit_spaces_different_chats(self):
+        waits = self.acquire_all(self.make_limiter(), [1, 2, 3, 4])
+        self.assertEqual(len(waits), 2)
+        self.assertAlmostEqual(waits[0], 0.1)
+        self.assertAlmostEqual(waits[1], 0.2)
+
+    def test_chat_limit_spaces_one_chat(self):
+        waits = self.acquire_all(self.make_limiter(), [1, 1])
+        self.assertEqual(len(waits), 1)
+        self.assertAlmostEqual(waits[0], 1.0)
+
+    def test_replies_are_not_held_by_one_busy_chat(self):
+        _reset_rate_limiter()
+        self.addCleanup(_reset_rate_limiter)
+        with mock.patch('tg_bot.ratelimit.time.monotonic', return_value=100.0):
+            limiter = get_rate_limiter("bot")
+        # Пользователь жмёт кнопку восемь раз подряд, потом пишет другой
+        waits = self.acquire_all(limiter, [1] * 8 + [2])
+        self.assertEqual(waits, [])
+
+    def test_pause_holds_every_chat(self):
+        limiter = self.make_limiter()
+        with mock.patch('tg_bot.ratelimit.time.monotonic', return_value=100.0):
+            limiter.pause(5)
+        waits = self.acquire_all(limiter, [1])
+        self.assertEqual(waits, [5.0])
+
+
+class SpeechIntervalIndexTests(SimpleTestCase):
+    def make_index(self, *intervals):
+        start = datetime(2026, 5, 20, 10, 0, tzinfo=dt_timezone.utc)
+        speeches = [
+            SimpleNamespace(
+                id=speech_id,
+                start_time=start + timedelta(minutes=begin),
+                end_time=start + timedelta(minutes=end),
+            )
+            for speech_id, (begin, end) in enumerate(intervals, start=1)
+        ]
+        return SpeechIntervalIndex(speeches, version="v", valid_until=None), start
+
+    def find_id(self, index, moment):
+        speech = index.find(moment)
+        return speech.id if speech else None
+
+    def test_finds_speech_covering_moment(self):
+        index, start = self.make_index((0, 30), (40, 60))
+        self.assertEqual(self.find_id(index, start + timedelta(minutes=10)), 1)
+        self.assertEqual(self.find_id(index, start + timedelta(minutes=40)), 2)
+        self.assertIsNone(self.find_id(index, start + timedelta(minutes=35)))
+        self.assertIsNone(self.find_id(index, start - timedelta(minutes=1)))
+        self.assertIsNone(self.find_id(index, start + timedelta(minutes=61)))
+
+    def test_long_speech_is_found_behind_short_ones(self):
+        index, start = self.make_index((0, 120), (10, 20), (30, 40))
+        self.assertEqual(self.find_id(index, start + timedelta(minutes=15)), 2)
+        self.assertEqual(self.find_id(index, start + timedelta(minutes=50)), 1)
+
+    def test_next_boundary(self):
+        index, start = self.make_index((0, 30), (40, 60))
+        self.assertEqual(index.next_boundary(start + timedelta(minutes=31)), start + timedelta(minutes=40))
+        self.assertIsNone(index.next_boundary(start + timedelta(minutes=60)))
+
+
+class ProgramVersionTests(TestCase):
+    def setUp(self):
+        program._local_version = None
+        program._local_program = None
+
+    def test_repeated_taps_do_not_query(self):
+        get_program()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(10):
+                get_program()
+        self.assertEqual(len(queries), 0)
+
+    def test_invalidation_in_this_process_is_seen_at_once(self):
+        self.assertFalse(get_program()["has_events"])
+        Event.objects.create(title="Митап", description="", date=timezone.now(), is_active=True)
+        invalidate_program()
+        self.assertTrue(get_program()["has_events"])
+
+    def test_foreign_invalidation_is_seen_after_check_interval(self):
+        self.assertFalse(get_program()["has_events"])
+        Event.objects.create(title="Митап", description="", date=timezone.now(), is_active=True)
+        # Версию сменил другой процесс: локально о ней ещё не знаем
+        program.cache.set(program.PROGRAM_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        self.assertFalse(get_program()["has_events"])
+        program._local_version_checked_at -= settings.BOT_SETTINGS["program_version_check_seconds"]
+        self.assertTrue(get_program()["has_events"])
+
+
+@override_settings(BOT_SETTINGS={**settings.BOT_SETTINGS, "speaker_questions_page_size": 3})
+class SpeakerQuestionsPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        event = Event.objects.create(title="Митап", description="", date=now)
+        speaker = Speaker.objects.create(name="Спикер", telegram_id=1)
+        cls.speech = Speech.objects.create(
+            event=event, speaker=speaker, title="Доклад", start_time=now, end_time=now
+        )
+        participant = Participant.objects.create(telegram_id=2)
+        # Одинаковые голоса и время, чтобы порядок решал id
+        same_moment = now.replace(microsecond=0)
+        for index, votes in enumerate([5, 0, 3, 3, 0, 0, 1, 3]):
+            Question.objects.create(
+                speech=cls.speech,
+                participant=participant,
+                question_text=f"Вопрос {index}",
+                votes=votes,
+                created_at=same_moment,
+            )
+
+    def page_cursor(self, direction, question):
+        data = _questions_cursor_data(direction, self.speech, 0, question)
+        _, _, _, cursor = _parse_questions_cursor_data(data)
+        return cursor
+
+    def test_next_then_prev_round_trip(self):
+        expected = list(
+            Question.objects.filter(speech=self.speech).order_by("-votes", "created_at", "id")
+        )
+
+        pages = []
+        page, has_more = _fetch_questions_page(self.speech, "next", None)
+        pages.append(page)
+        while has_more:
+            page, has_more = _fetch_questions_page(self.speech, "next", self.page_cursor("next", page[-1]))
+            pages.append(page)
+        self.assertEqual([question for page in pages for question in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+
+        for previous, current in zip(reversed(pages[:-1]), reversed(pages[1:])):
+            page, has_more = _fetch_questions_page(self.speech, "prev", self.page_cursor("prev", current[0]))
+            self.assertEqual(page, previous)
+        self.assertFalse(has_more)
+
+    def test_duplicates_are_hidden(self):
+        representative = Question.objects.filter(speech=self.speech).first()
+        Question.objects.filter(speech=self.speech).exclude(id=representative.id).update(
+            duplicate_of=representative
+        )
+        page, has_more = _fetch_questions_page(self.speech, "next", None)
+        self.assertEqual(page, [representative])
+        self.assertFalse(has_more)
+
+
+class MinHashTests(SimpleTestCase):
+    def test_similarity_tracks_text_overlap(self):
+        question = "Как вы мигрировали базу данных без простоя?"
+        self.assertEqual(similarity(minhash(question), minhash(question)), 1)
+        self.assertEqual(
+            similarity(minhash(question), minhash("  как вы МИГРИРОВАЛИ базу данных без простоя ")), 1
+        )
+        self.assertGreater(
+            similarity(minhash(question), minhash("Как вы мигрировали базу данных без простоя сервиса?")),
+            SIMILARITY_THRESHOLD,
+        )
+        self.assertLess(
+            similarity(minhash(question), minhash("Какой стек вы используете для фронтенда?")),
+            SIMILARITY_THRESHOLD,
+        )
+
+
+class MatchEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = MatchEngine()
+        # participant_id совпадает с telegram_id
+        self.add(1, "Python разработчик", "4 года", "дизайнер")
+        self.add(2, "Дизайнер интерфейсов", "2 года", "python разработчик")
+        self.add(3, "Дизайнер", "1 год", "маркетолог")
+        self.add(4, "Маркетолог", "3 года", "python")
+        self.mark_seen(1)
+
+    def add(self, participant_id, position, experience, looking_for):
+        self.engine.upsert(participant_id, participant_id, position, experience, looking_for)
+
+    def mark_seen(self, viewer_id, *candidate_ids):
+        # Маска в памяти, чтобы движок не ходил в БД за просмотренными
+        mask = np.zeros(len(self.engine.offers), dtype=bool)
+        mask[[self.engine.rows[pk] for pk in candidate_ids]] = True
+        self.engine.seen_masks[viewer_id] = mask
+
+    def test_mutual_matches_go_first(self):
+        self.assertEqual(self.engine.top_candidates(1, k=3), [(2, True), (3, False), (4, False)])
+
+    def test_seen_and_excluded_are_skipped(self):
+        self.mark_seen(1, 3)
+        self.assertEqual(self.engine.top_candidates(1, k=3, exclude_ids=[2]), [(4, False)])
+
+    def test_scan_fallback_without_profile(self):
+        # Без анкеты индексы не помогают: полный проход, новые анкеты выше
+        self.assertEqual(self.engine.top_candidates(999, k=2), [(4, False), (3, False)])
+
+    def test_scan_fills_up_to_k(self):
+        self.add(5, "Тестировщик", "1 год", "тимлид")
+        self.mark_seen(5)
+        self.assertEqual(len(self.engine.top_candidates(5, k=3)), 3)
+
+    def test_interested_in(self):
+        self.assertEqual(self.engine.interested_in(2, [1, 2, 3, 4]), [1])
+        self.mark_seen(1, 2)
+        self.assertEqual(self.engine.interested_in(2, [1, 2, 3, 4]), [])
+
+    def test_upsert_replaces_terms(self):
+        self.add(3, "Маркетолог", "1 год", "маркетолог")
+        row = self.engine.rows[3]
+        self.assertNotIn(row, self.engine.offer_index["дизай"])
+        self.assertIn(row, self.engine.offer_index["марке"])
+        np.testing.assert_array_equal(
+            self.engine.document_frequency, (self.engine.offers[:self.engine.size] > 0).sum(axis=0)
+        )
+        self.assertEqual(self.engine.top_candidates(1, k=1), [(2, True)])
+        self.assertNotIn(3, [pk for pk, _ in self.engine.top_candidates(1, k=2)])
+
+    def test_rows_grow_past_initial_capacity(self):
+        self.mark_seen(1, 2)
+        for participant_id in range(5, 1100):
+            self.add(participant_id, "Бухгалтер", "", "")
+        self.add(1100, "Дизайнер", "", "")
+
+        self.assertEqual(self.engine.size, 1100)
+        self.assertGreaterEqual(len(self.engine.offers), 1100)
+        mask = self.engine.seen_masks[1]
+        self.assertEqual(len(mask), len(self.engine.offers))
+        self.assertTrue(mask[self.engine.rows[2]])
+        self.assertEqual(self.engine.top_candidates(1, k=2), [(1100, False), (3, False)])
+
+
+class QuestionClustererTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        event = Event.objects.create(title="Митап", description="", date=now)
+        speaker = Speaker.objects.create(name="Спикер", telegram_id=1)
+        cls.speech = Speech.objects.create(
+            event=event, speaker=speaker, title="Доклад", start_time=now, end_time=now
+        )
+        cls.participant = Participant.objects.create(telegram_id=2)
+
+    def save_questions(self, clusterer, *texts):
+        questions = [
+            Question.objects.create(
+                speech=self.speech, participant=self.participant, question_text=text, uid=uuid.uuid4()
+            )
+            for text in texts
+        ]
+        clusterer.questions_saved([{"uid": question.uid} for question in questions])
+        return questions
+
+    def test_near_duplicates_join_first_question(self):
+        clusterer = QuestionClusterer()
+        first, duplicate, other = self.save_questions(
+            clusterer,
+            "Как вы мигрировали базу данных без простоя?",
+            "Как вы мигрировали базу данных без простоя сервиса?",
+            "Какой стек вы используете для фронтенда?",
+        )
+        # Следующая пачка сравнивается с уже известными представителями
+        (late_duplicate,) = self.save_questions(clusterer, "как вы мигрировали базу данных без простоя")
+
+        for question in (first, duplicate, other, late_duplicate):
+            question.refresh_from_db()
+        self.assertIsNone(first.duplicate_of_id)
+        self.assertEqual(duplicate.duplicate_of_id, first.id)
+        self.assertEqual(late_duplicate.duplicate_of_id, first.id)
+        self.assertEqual(first.duplicates_count, 2)
+        self.assertIsNone(other.duplicate_of_id)
+
+    def test_representatives_are_loaded_after_restart(self):
+        (first,) = self.save_questions(QuestionClusterer(), "Будут ли доступны слайды доклада?")
+        (duplicate,) = self.save_questions(QuestionClusterer(), "Будут ли доступны слайды этого доклада?")
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.duplicate_of_id, first.id)
+
+    def test_replayed_batch_is_not_counted_twice(self):
+        clusterer = QuestionClusterer()
+        first, duplicate = self.save_questions(
+            clusterer, "Где посмотреть запись доклада?", "Где посмотреть запись этого доклада?"
+        )
+        clusterer.questions_saved([{"uid": first.uid}, {"uid": duplicate.uid}])
+        first.refresh_from_db()
+        self.assertEqual(first.duplicates_count, 1)
+
+
+class VoteCounterTests(TransactionTestCase):
+    def setUp(self):
+        now = timezone.now()
+        event = Event.objects.create(title="Митап", description="", date=now)
+        speaker = Speaker.objects.create(name="Спикер", telegram_id=1)
+        self.speech = Speech.objects.create(
+            event=event, speaker=speaker, title="Доклад", start_time=now, end_time=now
+        )
+        participant = Participant.objects.create(telegram_id=2)
+        self.deleted, self.kept = [
+            Question.objects.create(speech=self.speech, participant=participant, question_text=text)
+            for text in ("Удалённый вопрос", "Вопрос")
+        ]
+
+    def test_vote_for_deleted_question_does_not_block_others(self):
+        counter = VoteCounter(flush_interval=60)
+        counter.vote(self.speech.id, self.deleted.id, 10)
+        counter.vote(self.speech.id, self.kept.id, 10)
+        counter.vote(self.speech.id, self.kept.id, 11)
+        self.deleted.delete()
+
+        self.assertEqual(counter.flush(), 2)
+        self.assertEqual(counter.pending, [])
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.votes, 2)
+
+    def test_repeated_vote_is_counted_once(self):
+        for _ in range(2):
+            # Второй счётчик не видит голос первого, как другой процесс до его записи
+            counter = VoteCounter(flush_interval=60)
+            counter.loaded_speeches.add(self.speech.id)
+            counter.vote(self.speech.id, self.kept.id, 10)
+            counter.flush()
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.votes, 1)
+
+
+class BroadcastCheckpointTests(TransactionTestCase):
+    def test_deleted_participant_does_not_roll_back_cursor(self):
+        event = Event.objects.create(title="Митап", description="", date=timezone.now())
+        notification = Notification.objects.create(event=event, title="Анонс", message="Текст")
+        participants = [Participant.objects.create(telegram_id=100 + index) for index in range(5)]
+        bot = mock.Mock()
+        service = NotificationService(bot, max_workers=1)
+        self.addCleanup(service.close)
+
+        # Участника удалили, пока пачка отправлялась
+        Participant.objects.filter(id=participants[2].id).delete()
+        service._send_batch(notification, participants, "Текст", None)
+
+        notification.refresh_from_db()
+        self.assertEqual(bot.send_message.call_count, 5)
+        self.assertEqual(notification.cursor, participants[-1].id)
+        self.assertEqual(notification.sent_count, 5)
+        self.assertEqual(UserNotification.objects.filter(notification=notification).count(), 4)
+
+
+class WebhookUpdateFeedTests(TestCase):
+    def setUp(self):
+        self.dispatcher = Dispatcher(Bot("123:abc"), Queue(), workers=0)
+        self.feed = WebhookUpdateFeed(self.dispatcher, poll_interval=0.1, idle_poll_interval=1, batch_size=10)
+
+    def receive(self, *update_ids):
+        TelegramUpdate.objects.bulk_create(
+            TelegramUpdate(update_id=update_id, payload=json.dumps({"update_id": update_id}))
+            for update_id in update_ids
+        )
+
+    def process_one(self):
+        self.dispatcher.process_update(self.dispatcher.update_queue.get_nowait())
+
+    def stored(self):
+        return set(TelegramUpdate.objects.values_list("update_id", flat=True))
+
+    def test_rows_are_deleted_only_after_processing(self):
+        self.receive(1, 2, 3)
+        self.assertEqual(self.feed.poll(), 3)
+        self.process_one()
+
+        # Переданные диспетчеру апдейты повторно не берутся
+        self.assertEqual(self.feed.poll(), 0)
+        self.assertEqual(self.dispatcher.update_queue.qsize(), 2)
+        self.assertEqual(self.stored(), {2, 3})
+
+    def test_late_update_with_lower_id_is_not_lost(self):
+        self.receive(5)
+        self.feed.poll()
+        self.process_one()
+        self.receive(4)
+
+        self.assertEqual(self.feed.poll(), 1)
+        self.process_one()
+        self.feed.poll()
+        self.assertEqual(self.stored(), set())
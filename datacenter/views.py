@@ -1,3 +1,32 @@
-from django.shortcuts import render
+import hmac
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .models import TelegramUpdate
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request):
+    secret = settings.TELEGRAM_SETTINGS["webhook_secret"]
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not hmac.compare_digest(token.encode(), secret.encode()):
+        return HttpResponseForbidden()
+
+    try:
+        payload = request.body.decode()
+        update_id = int(json.loads(payload)["update_id"])
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest()
+
+    # Обработает апдейт runbot --webhook. Повторную доставку того же апдейта
+    # Telegram-ом отсекает уникальный update_id
+    TelegramUpdate.objects.bulk_create(
+        [TelegramUpdate(update_id=update_id, payload=payload)],
+        ignore_conflicts=True,
+    )
+    return HttpResponse()
@@ -56,7 +56,80 @@ TEMPLATES = [
 
 NOTIFICATION_SETTINGS = {
     "reminder_minutes_before": 15,
-    "max_reties": 3,
+    "max_retries": 3,
+    "retry_base_delay_seconds": 1,
+    "queue_poll_seconds": 2,
+    "delivery_workers": 16,
+    "delivery_records_chunk_size": 500,
+    "broadcast_batch_size": 200,
+    "broadcast_lease_seconds": 300,
+    "program_change_window_seconds": 60,
+    # Сколько символов изменений собирается в одно сообщение, остальные только считаются
+    "program_change_max_length": 3500,
+    # Упавшая рассылка откладывается на retry_base * 2^(попытка-1) секунд,
+    # после max_delivery_attempts попыток помечается как неотправленная
+    "max_delivery_attempts": 5,
+    "delivery_retry_base_seconds": 30,
+}
+
+BOT_SETTINGS = {
+    # Страховка на случай, если админка и бот работают с разными кэшами
+    "program_cache_seconds": 60,
+    # Как часто процесс сверяет свою версию программы с общим кэшем: правки из админки
+    # видны боту и планировщику напоминаний не позже чем через столько секунд,
+    # а в остальное время запросов к кэшу нет
+    "program_version_check_seconds": 5,
+    # Вопросы из зала пишутся в журнал и сбрасываются в БД пачками
+    "questions_journal_path": BASE_DIR / "questions.journal",
+    "questions_flush_size": 50,
+    "questions_flush_interval_ms": 500,
+    # Дайджест новых вопросов спикеру: раз в интервал или сразу после batch_size вопросов
+    "questions_push_interval_seconds": 30,
+    "questions_push_batch_size": 10,
+    "speaker_questions_page_size": 10,
+    # Голоса за вопросы копятся в памяти и пишутся в БД раз в столько секунд
+    "question_votes_flush_seconds": 5,
+    "live_questions_count": 10,
+    # Как часто изменившиеся состояния диалогов (user_data) записываются в БД.
+    # При падении runbot теряются изменения не больше чем за этот интервал
+    "conversation_flush_seconds": 5,
+    # runbot --webhook забирает апдейты, принятые веб-приложением, раз в столько миллисекунд;
+    # пока апдейтов нет, интервал удваивается до webhook_idle_poll_interval_ms
+    "webhook_poll_interval_ms": 100,
+    "webhook_idle_poll_interval_ms": 2000,
+    "webhook_batch_size": 100,
+}
+
+# Кэш общий для админки, бота и рассылки: сигналы из админки меняют версию программы,
+# и бот сразу видит изменения. По умолчанию это таблица в БД (manage.py createcachetable),
+# её можно заменить на Redis или Memcached, но не на кэш в памяти процесса
+CACHES = {
+    "default": {
+        "BACKEND": env.str("CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": env.str("CACHE_LOCATION", "django_cache"),
+    }
+}
+
+# Лимиты Bot API: около 30 сообщений в секунду на бота и ~1 в секунду на чат.
+# Общий лимит поделён между процессами, которые шлют сообщения: рассылками занят
+# runnotifier, ответами на апдейты — runbot. Каждый процесс соблюдает только свою долю,
+# поэтому в сумме они не превышают лимит бота
+TELEGRAM_SETTINGS = {
+    "global_messages_per_second": {"notifier": 20, "bot": 10},
+    "global_burst": {"notifier": 20, "bot": 10},
+    # Лимит на чат соблюдает только runnotifier: ответы бота ждать его не должны
+    "chat_messages_per_second": 1,
+    "chat_burst": 3,
+    # Пул keep-alive соединений сервиса рассылки, не меньше delivery_workers
+    "connection_pool_size": 20,
+    "connect_timeout": 5.0,
+    "read_timeout": 10.0,
+    # Webhook: адрес, на который Telegram шлёт апдейты, и секрет из заголовка
+    # X-Telegram-Bot-Api-Secret-Token
+    "webhook_url": env.str("TELEGRAM_WEBHOOK_URL", default=""),
+    "webhook_secret": env.str("TELEGRAM_WEBHOOK_SECRET", default=""),
+    # Другой адрес Bot API, например локальный фейковый сервер для нагрузочных тестов
+    "api_base_url": env.str("TELEGRAM_API_BASE_URL", default=None),
 }
 
 WSGI_APPLICATION = "meetup.wsgi.application"
@@ -17,8 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from datacenter.views import telegram_webhook
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("telegram/webhook/", telegram_webhook, name="telegram-webhook"),
 ]
 
 
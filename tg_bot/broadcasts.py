@@ -0,0 +1,112 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from datacenter.models import Notification
+from tg_bot.reminders import notify_event_changed
+
+
+logger = logging.getLogger(__name__)
+
+_wakeup = threading.Event()
+
+
+def wake_worker():
+    """Будит воркер этого процесса, не дожидаясь очередного опроса очереди."""
+    _wakeup.set()
+
+
+def claim_next_notification():
+    """
+    Забирает из очереди следующее готовое к отправке уведомление или рассылку,
+    чей воркер перестал отмечаться дольше broadcast_lease_seconds (упал или был перезапущен).
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=settings.NOTIFICATION_SETTINGS["broadcast_lease_seconds"])
+    ready = Q(status='pending') & (Q(scheduled_for__isnull=True) | Q(scheduled_for__lte=now))
+    abandoned = Q(status='processing', heartbeat_at__lt=now - lease)
+
+    candidate_ids = (
+        Notification.objects.filter(ready | abandoned)
+        .order_by('created_at')
+        .values_list('id', flat=True)[:10]
+    )
+
+    for notification_id in candidate_ids:
+        # Другой воркер мог успеть забрать уведомление раньше нас
+        claimed = Notification.objects.filter(
+            ready | abandoned, id=notification_id
+        ).update(status='processing', heartbeat_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            notification = Notification.objects.select_related('event', 'speech').get(id=notification_id)
+            if notification.attempts > settings.NOTIFICATION_SETTINGS["max_delivery_attempts"]:
+                # Воркер падал на ней, не успев записать ошибку
+                _give_up(notification)
+                continue
+            if notification.notification_type == 'program_change':
+                # Программу могли поменять в другом процессе (админка) — обновляем напоминания
+                notify_event_changed(notification.event_id)
+            if notification.cursor:
+                logger.info(f"Resuming notification {notification.id} after participant {notification.cursor}")
+            return notification
+
+    return None
+
+
+def _retry_later(notification, error):
+    """
+    Откладывает упавшую рассылку с экспоненциальной задержкой, чтобы она не забирала
+    очередь раз за разом и не задерживала следующие уведомления.
+    """
+    notification.last_error = str(error)
+    if notification.attempts >= settings.NOTIFICATION_SETTINGS["max_delivery_attempts"]:
+        _give_up(notification)
+        return
+
+    delay = settings.NOTIFICATION_SETTINGS["delivery_retry_base_seconds"] * 2 ** (notification.attempts - 1)
+    Notification.objects.filter(id=notification.id).update(
+        status='pending',
+        scheduled_for=timezone.now() + timedelta(seconds=delay),
+        last_error=notification.last_error,
+    )
+
+
+def _give_up(notification):
+    logger.error(f"Notification {notification.id} failed after {notification.attempts} attempts")
+    Notification.objects.filter(id=notification.id).update(status='failed', last_error=notification.last_error)
+
+
+def process_pending_notifications(notification_service, limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        notification = claim_next_notification()
+        if not notification:
+            break
+
+        try:
+            sent_count = notification_service.deliver(notification)
+            logger.info(f"Notification {notification.id} delivered to {sent_count} recipients")
+        except Exception as e:
+            logger.error(f"Error delivering notification {notification.id}: {e}")
+            _retry_later(notification, e)
+            break
+        processed += 1
+
+    return processed
+
+
+def run_worker(notification_service):
+    poll_interval = settings.NOTIFICATION_SETTINGS["queue_poll_seconds"]
+    logger.info("Notification worker started")
+
+    while True:
+        close_old_connections()
+        processed = process_pending_notifications(notification_service)
+        if not processed:
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
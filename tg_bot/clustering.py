@@ -0,0 +1,134 @@
+import random
+import re
+import zlib
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from datacenter.models import Question
+
+
+# 16 полос по 4 строки: пары с похожестью от ~0.5 почти всегда попадают в общую корзину
+BANDS = 16
+ROWS = 4
+SHINGLE_SIZE = 5
+SIMILARITY_THRESHOLD = 0.5
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(42)
+_PERMUTATIONS = [
+    (_random.randrange(1, _PRIME), _random.randrange(0, _PRIME))
+    for _ in range(BANDS * ROWS)
+]
+
+
+def _shingles(text):
+    normalized = " ".join(re.findall(r"\w+", text.lower()))
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    hashes = [zlib.crc32(shingle.encode()) for shingle in _shingles(text)]
+    return tuple(
+        min((a * value + b) % _PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(signature, other):
+    """Оценка коэффициента Жаккара по совпадающим позициям подписей."""
+    return sum(x == y for x, y in zip(signature, other)) / len(signature)
+
+
+class SpeechClusters:
+    """LSH-индекс по представителям кластеров одного выступления."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.signatures = {}
+        self.known_ids = set()
+
+    def find(self, signature):
+        best_id, best_score = None, SIMILARITY_THRESHOLD
+        for candidate_id in self._candidates(signature):
+            score = similarity(signature, self.signatures[candidate_id])
+            if score >= best_score:
+                best_id, best_score = candidate_id, score
+        return best_id
+
+    def add(self, question_id, signature):
+        self.signatures[question_id] = signature
+        for band, key in self._band_keys(signature):
+            self.buckets.setdefault((band, key), question_id)
+
+    def _candidates(self, signature):
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            representative = self.buckets.get((band, key))
+            if representative is not None:
+                candidates.add(representative)
+        return candidates
+
+    def _band_keys(self, signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+
+class QuestionClusterer:
+    """
+    Объединяет почти одинаковые вопросы к выступлению по мере их поступления.
+    Новый вопрос сравнивается только с представителями из своих LSH-корзин,
+    поэтому стоимость не растёт с числом вопросов. Дубликат получает duplicate_of,
+    а у представителя растёт duplicates_count.
+    """
+
+    def __init__(self):
+        self.speeches = {}
+
+    def questions_saved(self, records):
+        uids = [record["uid"] for record in records]
+        questions = list(
+            Question.objects.filter(uid__in=uids, duplicate_of__isnull=True)
+            .values_list('id', 'speech_id', 'question_text')
+            .order_by('id')
+        )
+        batch_ids = {question_id for question_id, _, _ in questions}
+
+        duplicates = defaultdict(list)
+        for question_id, speech_id, text in questions:
+            clusters = self._get_speech_clusters(speech_id, batch_ids)
+            if question_id in clusters.known_ids:
+                # Вопрос уже разобран: запись повторно пришла из журнала
+                continue
+            clusters.known_ids.add(question_id)
+
+            signature = minhash(text)
+            representative = clusters.find(signature)
+            if representative is None:
+                clusters.add(question_id, signature)
+            else:
+                duplicates[representative].append(question_id)
+
+        with transaction.atomic():
+            for representative, question_ids in duplicates.items():
+                Question.objects.filter(id__in=question_ids).update(duplicate_of=representative)
+                Question.objects.filter(id=representative).update(
+                    duplicates_count=F('duplicates_count') + len(question_ids)
+                )
+
+    def _get_speech_clusters(self, speech_id, batch_ids):
+        clusters = self.speeches.get(speech_id)
+        if clusters is None:
+            # Один раз на выступление поднимаем представителей, уже сохранённых в БД
+            clusters = SpeechClusters()
+            representatives = Question.objects.filter(
+                speech_id=speech_id, duplicate_of__isnull=True
+            ).exclude(id__in=batch_ids).values_list('id', 'question_text')
+            for question_id, text in representatives:
+                clusters.known_ids.add(question_id)
+                clusters.add(question_id, minhash(text))
+            self.speeches[speech_id] = clusters
+        return clusters
@@ -6,13 +6,15 @@ from telegram.ext import (
 from tg_bot.talks import (
     start_ask_question, handle_question_if_waiting, show_schedule, 
     show_speaker_questions, subscribe_to_next_events, unsubscribe_from_events,
-    notification_settings, handle_settings_callback, handle_subscribe_callback
+    notification_settings, handle_settings_callback, handle_subscribe_callback,
+    toggle_questions_push, handle_speaker_questions_callback, show_live_questions,
+    handle_vote_callback
 )
 from tg_bot.networking import (
     start_networking, handle_networking_message_if_active
 )
 from tg_bot.donations import start_donation, handle_donation_message_if_active
-from datacenter.models import Speaker
+from datacenter.models import Participant, Speaker
 
 
 def is_speaker(telegram_id: int) -> bool:
@@ -27,18 +29,21 @@ def get_main_menu_keyboard(telegram_id: int = None) -> ReplyKeyboardMarkup:
         keyboard = [
             [KeyboardButton("Вопрос спикеру"), KeyboardButton("Программа")],
             [KeyboardButton("Нетворкинг"), KeyboardButton("Мои вопросы")],
-            [KeyboardButton("Поддержать митап")],
+            [KeyboardButton("Вопросы зала"), KeyboardButton("Поддержать митап")],
         ]  
     else:
         keyboard = [
             [KeyboardButton("Вопрос спикеру"), KeyboardButton("Программа")],
-            [KeyboardButton("Нетворкинг"), KeyboardButton("Поддержать митап")],
+            [KeyboardButton("Нетворкинг"), KeyboardButton("Вопросы зала")],
+            [KeyboardButton("Поддержать митап")],
         ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
 def start(update: Update, context: CallbackContext):
     user = update.effective_user
+    # Раз пользователь снова пишет боту, рассылки ему опять доходят
+    Participant.objects.filter(telegram_id=user.id, bot_blocked=True).update(bot_blocked=False)
     keyboard = get_main_menu_keyboard(user.id)
     if is_speaker(user.id):
         text = (
@@ -57,6 +62,7 @@ def start(update: Update, context: CallbackContext):
             "Я бот PythonMeetup.\n\n"
             "Что умею:\n"
             "• Передать твой вопрос текущему спикеру\n"
+            "• Проголосовать за вопросы, которые хочешь услышать\n"
             "• Показать программу митапа\n"
             "• Помочь познакомиться с другими разработчиками\n"
             "• Дать ссылку, чтобы поддержать мероприятие\n"
@@ -76,7 +82,9 @@ def help_command(update: Update, context: CallbackContext):
         "/subscribe — подписаться на уведомления\n"
         "/unsubscribe — отписаться от уведомлений\n"
         "/settings — настройки уведомлений\n"
-        "/my_questions — для спикеров: посмотреть вопросы\n\n"
+        "/top_questions — проголосовать за вопросы к текущему докладу\n"
+        "/my_questions — для спикеров: посмотреть вопросы\n"
+        "/push_questions — для спикеров: присылать новые вопросы сразу\n\n"
         "Основные действия доступны через кнопки внизу экрана."
     )
     update.message.reply_text(text)
@@ -109,6 +117,9 @@ def menu_router(update: Update, context: CallbackContext):
     elif text == "Мои вопросы":
         show_speaker_questions(update, context)
 
+    elif text == "Вопросы зала":
+        show_live_questions(update, context)
+
     else:
         update.message.reply_text(
             "Я тебя не очень понял\n"
@@ -124,6 +135,8 @@ def register_common_handlers(dispatcher):
     dispatcher.add_handler(CommandHandler("help", help_command))
     dispatcher.add_handler(CommandHandler("update", update_menu))
     dispatcher.add_handler(CommandHandler("my_questions", show_speaker_questions))
+    dispatcher.add_handler(CommandHandler("push_questions", toggle_questions_push))
+    dispatcher.add_handler(CommandHandler("top_questions", show_live_questions))
     dispatcher.add_handler(CommandHandler("subscribe", subscribe_to_next_events))
     dispatcher.add_handler(CommandHandler("unsubscribe", unsubscribe_from_events))
     dispatcher.add_handler(CommandHandler("settings", notification_settings))
@@ -141,6 +154,18 @@ def register_common_handlers(dispatcher):
         )
     )
     
+    dispatcher.add_handler(
+        CallbackQueryHandler(
+            handle_speaker_questions_callback, pattern='^questions_(next|prev)_'
+        )
+    )
+
+    dispatcher.add_handler(
+        CallbackQueryHandler(
+            handle_vote_callback, pattern='^vote_'
+        )
+    )
+
     dispatcher.add_handler(
         MessageHandler(Filters.text & ~Filters.command, menu_router)
     )
@@ -0,0 +1,279 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from datacenter.models import NetworkingSeen, Participant
+
+
+# Размер хэшированного пространства признаков: 512 float32 на анкету,
+# 30 000 анкет — около 60 МБ на матрицу
+FEATURES = 512
+STEM_LENGTH = 5
+# Битовые маски просмотренных анкет держим только для недавно активных пользователей
+SEEN_MASKS_LIMIT = 1000
+
+# Слова из «кого ищу», которые на самом деле говорят об опыте
+EXPERIENCE_WORDS = {
+    "junior": "exp:junior", "джун": "exp:junior", "стаже": "exp:junior", "начин": "exp:junior",
+    "middl": "exp:middle", "мидл": "exp:middle",
+    "senio": "exp:senior", "сеньо": "exp:senior", "синьо": "exp:senior",
+    "lead": "exp:lead", "тимли": "exp:lead", "лид": "exp:lead",
+}
+
+
+def _terms(text):
+    """Нормализованные термы: слова, обрезанные до основы, и признаки опыта."""
+    terms = []
+    for word in re.findall(r"\w+", (text or "").lower()):
+        if len(word) < 2 or word.isdigit():
+            continue
+        stem = word[:STEM_LENGTH]
+        terms.append(stem)
+        if stem in EXPERIENCE_WORDS:
+            terms.append(EXPERIENCE_WORDS[stem])
+    return terms
+
+
+def _experience_term(experience):
+    """«6 месяцев», «2 года», «10+ лет» → признак уровня."""
+    text = (experience or "").lower()
+    match = re.search(r"\d+(?:[.,]\d+)?", text)
+    if not match:
+        return None
+    years = float(match.group().replace(",", "."))
+    if "мес" in text or "month" in text:
+        years /= 12
+    if years < 1:
+        return "exp:junior"
+    if years < 3:
+        return "exp:middle"
+    if years < 6:
+        return "exp:senior"
+    return "exp:lead"
+
+
+def offer_terms(position, experience):
+    """Кто человек: должность и уровень."""
+    terms = _terms(position)
+    experience_term = _experience_term(experience)
+    if experience_term:
+        terms.append(experience_term)
+    return terms
+
+
+def wish_terms(looking_for):
+    """Кого человек ищет."""
+    return _terms(looking_for)
+
+
+def _vectorize(terms):
+    vector = np.zeros(FEATURES, dtype=np.float32)
+    for term in terms:
+        vector[zlib.crc32(term.encode()) % FEATURES] += 1
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class MatchEngine:
+    """
+    Анкеты нетворкинга в виде двух матриц хэшированных признаков:
+    offers — кто человек (должность, опыт), wishes — кого он ищет (looking_for).
+
+    Инвертированные индексы «терм → строки» по offers и wishes дают кандидатов без прохода
+    по всем анкетам: кто подходит под запрос пользователя и кто сам ищет таких, как он.
+    Их оцениваем в обе стороны, и взаимные совпадения идут первыми. Если индексы
+    дали меньше K кандидатов, добираем полным умножением матрицы на вектор.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.size = 0
+        self.offers = np.zeros((0, FEATURES), dtype=np.float32)
+        self.wishes = np.zeros((0, FEATURES), dtype=np.float32)
+        self.participant_ids = np.zeros(0, dtype=np.int64)
+        # Сколько анкет содержит признак: для IDF
+        self.document_frequency = np.zeros(FEATURES, dtype=np.float32)
+        self.rows = {}
+        self.rows_by_telegram_id = {}
+        self.offer_index = defaultdict(set)
+        self.wish_index = defaultdict(set)
+        self.row_terms = {}
+        # participant_id зрителя → маска строк, которые он уже видел
+        self.seen_masks = OrderedDict()
+
+    def load(self):
+        profiles = Participant.objects.exclude(position='').values_list(
+            'id', 'telegram_id', 'position', 'experience', 'looking_for'
+        )
+        for participant_id, telegram_id, position, experience, looking_for in profiles.iterator():
+            self.upsert(participant_id, telegram_id, position, experience, looking_for)
+        return self
+
+    def upsert(self, participant_id, telegram_id, position, experience, looking_for):
+        offered = set(offer_terms(position, experience))
+        wished = set(wish_terms(looking_for))
+        offer = _vectorize(offered)
+        wish = _vectorize(wished)
+
+        with self.lock:
+            row = self.rows.get(participant_id)
+            if row is None:
+                row = self._append_row(participant_id)
+            else:
+                self.document_frequency -= self.offers[row] > 0
+                self._unindex(row)
+            self.offers[row] = offer
+            self.wishes[row] = wish
+            self.document_frequency += offer > 0
+            self.rows_by_telegram_id[telegram_id] = row
+
+            self.row_terms[row] = (offered, wished)
+            for term in offered:
+                self.offer_index[term].add(row)
+            for term in wished:
+                self.wish_index[term].add(row)
+
+    def participant_id(self, telegram_id):
+        with self.lock:
+            row = self.rows_by_telegram_id.get(telegram_id)
+            return None if row is None else int(self.participant_ids[row])
+
+    def interested_in(self, participant_id, viewer_ids):
+        """
+        Кому из viewer_ids подходит анкета participant_id: их wishes пересекаются с её offers.
+        Тех, кто уже видел анкету (по маске в памяти), не возвращаем.
+        """
+        with self.lock:
+            row = self.rows.get(participant_id)
+            if row is None:
+                return []
+            offered, _ = self.row_terms[row]
+            wisher_rows = set().union(*(self.wish_index.get(term, ()) for term in offered))
+            interested = []
+            for viewer_id in viewer_ids:
+                if viewer_id == participant_id or self.rows.get(viewer_id) not in wisher_rows:
+                    continue
+                mask = self.seen_masks.get(viewer_id)
+                if mask is not None and mask[row]:
+                    continue
+                interested.append(viewer_id)
+            return interested
+
+    def mark_seen(self, viewer_id, candidate_id):
+        with self.lock:
+            mask = self.seen_masks.get(viewer_id)
+            row = self.rows.get(candidate_id)
+            if mask is not None and row is not None:
+                mask[row] = True
+
+    def top_candidates(self, telegram_id, k, exclude_ids=()):
+        """
+        До k пар (participant_id, взаимное ли совпадение), лучшие первыми.
+        Уже просмотренные отсекаются маской, так что цена не зависит от их числа.
+        """
+        with self.lock:
+            if not self.size:
+                return []
+            row = self.rows_by_telegram_id.get(telegram_id)
+
+            hidden = np.zeros(self.size, dtype=bool)
+            if row is not None:
+                hidden[row] = True
+                hidden |= self._seen_mask(int(self.participant_ids[row]))[:self.size]
+            if exclude_ids:
+                hidden[[self.rows[pk] for pk in exclude_ids if pk in self.rows]] = True
+
+            matches = self._indexed_matches(row, hidden, k) if row is not None else []
+            if len(matches) < k:
+                matches += self._scanned_matches(row, hidden, k - len(matches), matches)
+            return matches
+
+    def _indexed_matches(self, row, hidden, k):
+        offered, wished = self.row_terms[row]
+        forward_rows = set().union(*(self.offer_index.get(term, ()) for term in wished))
+        backward_rows = set().union(*(self.wish_index.get(term, ()) for term in offered))
+        candidates = np.fromiter(forward_rows | backward_rows, dtype=np.int64)
+        candidates = candidates[~hidden[candidates]]
+        if not len(candidates):
+            return []
+
+        idf = self._idf()
+        # Насколько кандидат подходит пользователю и насколько пользователь подходит кандидату
+        forward = self.offers[candidates] @ (self.wishes[row] * idf)
+        backward = self.wishes[candidates] @ (self.offers[row] * idf)
+        mutual = (forward > 0) & (backward > 0)
+
+        order = np.lexsort((-backward, -forward, ~mutual))[:k]
+        return [(int(self.participant_ids[i]), bool(mutual[j])) for j, i in zip(order, candidates[order])]
+
+    def _scanned_matches(self, row, hidden, k, already_found):
+        # Чуть выше при равенстве — кто заполнил анкету позже
+        scores = np.arange(self.size, dtype=np.float32) * 1e-7
+        if row is not None:
+            scores += self.offers[:self.size] @ (self.wishes[row] * self._idf())
+        scores[hidden] = -np.inf
+        found_rows = [self.rows[pk] for pk, _ in already_found]
+        scores[found_rows] = -np.inf
+
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.participant_ids[i]), False) for i in top if scores[i] != -np.inf]
+
+    def _idf(self):
+        return np.log((1 + self.size) / (1 + self.document_frequency)) + 1
+
+    def _unindex(self, row):
+        offered, wished = self.row_terms.pop(row, (set(), set()))
+        for term in offered:
+            self.offer_index[term].discard(row)
+        for term in wished:
+            self.wish_index[term].discard(row)
+
+    def _seen_mask(self, viewer_id):
+        mask = self.seen_masks.get(viewer_id)
+        if mask is None:
+            # Один запрос по (viewer, candidate) на пользователя, пока его маска в памяти
+            mask = np.zeros(len(self.offers), dtype=bool)
+            seen = NetworkingSeen.objects.filter(viewer_id=viewer_id).values_list('candidate_id', flat=True)
+            rows = [self.rows[pk] for pk in seen if pk in self.rows]
+            mask[rows] = True
+            self.seen_masks[viewer_id] = mask
+            if len(self.seen_masks) > SEEN_MASKS_LIMIT:
+                self.seen_masks.popitem(last=False)
+        self.seen_masks.move_to_end(viewer_id)
+        return mask
+
+    def _append_row(self, participant_id):
+        if self.size == len(self.offers):
+            capacity = max(1024, 2 * self.size)
+            self.offers = np.resize(self.offers, (capacity, FEATURES))
+            self.wishes = np.resize(self.wishes, (capacity, FEATURES))
+            self.participant_ids = np.resize(self.participant_ids, capacity)
+            for viewer_id, mask in self.seen_masks.items():
+                grown = np.zeros(capacity, dtype=bool)
+                grown[:len(mask)] = mask
+                self.seen_masks[viewer_id] = grown
+        row = self.size
+        self.size += 1
+        self.participant_ids[row] = participant_id
+        self.rows[participant_id] = row
+        return row
+
+
+_match_engine = None
+_match_engine_lock = threading.Lock()
+
+
+def get_match_engine():
+    global _match_engine
+    with _match_engine_lock:
+        if _match_engine is None:
+            _match_engine = MatchEngine().load()
+        return _match_engine
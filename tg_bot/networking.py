@@ -1,6 +1,14 @@
+import logging
+
+from django.db import transaction
 from telegram import Update
+from telegram.error import TelegramError, Unauthorized
 from telegram.ext import CallbackContext
-from datacenter.models import Participant
+from datacenter.models import NetworkingSeen, Participant
+from .matching import get_match_engine
+
+
+logger = logging.getLogger(__name__)
 
 PROFILE_QUESTIONS = [
     (
@@ -17,24 +25,10 @@ PROFILE_QUESTIONS = [
     ),
 ]
 
-# ВРЕМЕННО вместо Django API.
-# Это нужно будет заменить на запрос к бэкенду.
-DUMMY_CANDIDATES = [
-    {
-        "full_name": "Аня",
-        "username": "anya_dev",
-        "role": "Python backend",
-        "experience": "2 года",
-        "looking_for": "других backend-разработчиков и тимлидов",
-    },
-    {
-        "full_name": "Илья",
-        "username": "ilya_data",
-        "role": "Data engineer",
-        "experience": "3 года",
-        "looking_for": "data-людей и ML-разработчиков",
-    },
-]
+# Сколько лучших кандидатов берём из движка за раз и при скольких оставшихся
+# подгружаем следующую пачку в фоне
+CANDIDATES_TOP_K = 20
+CANDIDATES_REFILL_AT = 5
 
 
 def start_networking(update: Update, context: CallbackContext) -> None:
@@ -127,11 +121,22 @@ def _finish_profile(update: Update, context: CallbackContext) -> None:
         participant.full_name = user.full_name
 
     participant.save()
+    get_match_engine().upsert(
+        participant.id,
+        participant.telegram_id,
+        participant.position,
+        participant.experience,
+        participant.looking_for,
+    )
     # print(f"[NETWORKING PROFILE] from {user.id} (@{user.username}): {form}")
 
     context.user_data["networking_state"] = None
     context.user_data["networking_step"] = 0
     context.user_data["networking_has_profile"] = True
+    # Пачка кандидатов подбиралась под старую анкету
+    context.user_data.pop("networking_candidates", None)
+    # Рассылку тем, кто ждал анкет, делаем в фоне, чтобы не задерживать ответ
+    context.dispatcher.run_async(_notify_waiting_users, context.bot, participant)
 
     update.message.reply_text(
         "Готово! Я сохранил твою анкету для нетворкинга.\n\n"
@@ -144,20 +149,22 @@ def _finish_profile(update: Update, context: CallbackContext) -> None:
 def start_matching(update: Update, context: CallbackContext) -> None:
     context.user_data["networking_state"] = "browsing_candidates"
 
-    candidate = _fetch_next_candidate_stub(update.effective_user.id, context)
+    candidate = _fetch_next_candidate(update.effective_user.id, context)
 
     if not candidate:
         context.user_data["networking_state"] = None
+        Participant.objects.filter(telegram_id=update.effective_user.id).update(networking_waiting=True)
+        context.user_data["networking_waiting"] = True
         update.message.reply_text(
             "Ты один из первых, кто заполнил анкету\n"
-            "Пока других анкет нет, но как только люди начнут заполнять, "
-            "я смогу кого-то тебе предложить.\n\n"
-            "Чуть позже просто снова нажми «Нетворкинг», чтобы попробовать ещё раз."
+            "Пока других анкет нет, но как только появится подходящая, "
+            "я сам пришлю её тебе."
         )
-        # TODO: Тут можно подписать пользователя
-        # на уведомление из Django, когда появятся новые анкеты
         return
 
+    if context.user_data.pop("networking_waiting", False):
+        Participant.objects.filter(telegram_id=update.effective_user.id).update(networking_waiting=False)
+
     context.user_data["networking_current_candidate"] = candidate
     _show_candidate(update, context, candidate)
 
@@ -172,6 +179,7 @@ def _handle_candidate_flow(update: Update, context: CallbackContext) -> bool:
     if text.startswith("стоп") or text in ("хватит", "stop"):
         context.user_data["networking_state"] = None
         context.user_data.pop("networking_current_candidate", None)
+        _save_seen(update.effective_user.id, context.user_data)
 
         update.message.reply_text(
             "Окей, остановимся на этом\n"
@@ -188,6 +196,24 @@ def _handle_candidate_flow(update: Update, context: CallbackContext) -> bool:
 
 
 def _show_candidate(update: Update, context: CallbackContext, candidate: dict) -> None:
+    intro = "Нашёл тебе человека для знакомства:\n\n"
+    if candidate.get("mutual"):
+        intro = (
+            "Нашёл тебе человека для знакомства, и это взаимно:\n"
+            "ты тоже подходишь под то, кого он ищет\n\n"
+        )
+
+    text = (
+        f"{intro}"
+        f"{_candidate_card(candidate)}"
+        "Если не хочешь общаться с этим человеком, напиши «Следующий».\n"
+        "Если пока хватит, напиши «Стоп»."
+    )
+
+    update.message.reply_text(text)
+
+
+def _candidate_card(candidate: dict) -> str:
     username = candidate.get("username")
     full_name = candidate.get("full_name") or "Не указано"
     role = candidate.get("role") or "Не указано"
@@ -195,7 +221,6 @@ def _show_candidate(update: Update, context: CallbackContext, candidate: dict) -
     looking_for = candidate.get("looking_for") or "Не указано"
 
     text = (
-        "Нашёл тебе человека для знакомства:\n\n"
         f"Имя: {full_name}\n"
         f"Кто: {role}\n"
         f"Опыт: {experience}\n"
@@ -207,20 +232,16 @@ def _show_candidate(update: Update, context: CallbackContext, candidate: dict) -
     else:
         text += "Связаться: ник в Telegram не указан\n\n"
 
-    text += (
-        "Если не хочешь общаться с этим человеком, напиши «Следующий».\n"
-        "Если пока хватит, напиши «Стоп»."
-    )
-
-    update.message.reply_text(text)
+    return text
 
 
 def _show_next_candidate(update: Update, context: CallbackContext) -> None:
-    candidate = _fetch_next_candidate_stub(update.effective_user.id, context)
+    candidate = _fetch_next_candidate(update.effective_user.id, context)
 
     if not candidate:
         context.user_data["networking_state"] = None
         context.user_data.pop("networking_current_candidate", None)
+        _save_seen(update.effective_user.id, context.user_data)
 
         update.message.reply_text(
             "Похоже, больше анкет пока нет ️\n"
@@ -232,37 +253,127 @@ def _show_next_candidate(update: Update, context: CallbackContext) -> None:
     _show_candidate(update, context, candidate)
 
 
-def _fetch_next_candidate_stub(user_telegram_id: int, context: CallbackContext):
+def _fetch_next_candidate(user_telegram_id: int, context: CallbackContext):
+    """
+    Следующий кандидат из пачки, заранее подобранной для этой сессии нетворкинга.
+    Пачка берётся одним запросом и подгружается в фоне, когда подходит к концу,
+    так что обычное «Следующий» вообще не ходит в БД.
+    """
+    queue = context.user_data.setdefault("networking_candidates", [])
+    if not queue:
+        _refill_candidates(user_telegram_id, context.user_data)
+    if not queue:
+        return None
+
+    candidate = queue.pop(0)
+    # Движок сразу перестаёт предлагать показанную анкету, а в БД просмотры уходят пачкой
+    engine = get_match_engine()
+    viewer_id = engine.participant_id(user_telegram_id)
+    if viewer_id is not None:
+        engine.mark_seen(viewer_id, candidate["id"])
+        context.user_data.setdefault("networking_unsaved_seen", []).append(candidate["id"])
+
+    if len(queue) <= CANDIDATES_REFILL_AT and not context.user_data.get("networking_refilling"):
+        context.user_data["networking_refilling"] = True
+        context.dispatcher.run_async(_refill_candidates, user_telegram_id, context.user_data)
+
+    return candidate
+
+
+def _refill_candidates(user_telegram_id: int, user_data: dict) -> None:
+    try:
+        _save_seen(user_telegram_id, user_data)
+
+        queue = user_data.setdefault("networking_candidates", [])
+        matches = get_match_engine().top_candidates(
+            user_telegram_id,
+            k=CANDIDATES_TOP_K,
+            exclude_ids={candidate["id"] for candidate in queue},
+        )
+        candidates = Participant.objects.in_bulk([pk for pk, _ in matches])
+
+        queue.extend(
+            {
+                "id": pk,
+                "full_name": candidates[pk].full_name,
+                "username": candidates[pk].username,
+                "role": candidates[pk].position,
+                "experience": candidates[pk].experience,
+                "looking_for": candidates[pk].looking_for,
+                "mutual": mutual,
+            }
+            for pk, mutual in matches
+            # Анкету могли удалить или очистить, пока движок о ней помнит
+            if pk in candidates and candidates[pk].position
+        )
+    finally:
+        user_data["networking_refilling"] = False
+
+
+def _save_seen(user_telegram_id: int, user_data: dict) -> None:
+    """Записывает накопленные просмотры в БД, чтобы они пережили перезапуск бота."""
+    seen_ids = user_data.pop("networking_unsaved_seen", [])
+    viewer_id = get_match_engine().participant_id(user_telegram_id)
+    if not seen_ids or viewer_id is None:
+        return
+
+    NetworkingSeen.objects.bulk_create(
+        [NetworkingSeen(viewer_id=viewer_id, candidate_id=candidate_id) for candidate_id in seen_ids],
+        ignore_conflicts=True,
+    )
+
+
+def _notify_waiting_users(bot, candidate: Participant) -> None:
     """
-    Временная заглушка.
-    Возвращает следующего кандидата из DUMMY_CANDIDATES, которого пользователь ещё не видел.
-    Эта функция должна дергать Django API.
+    Присылает новую анкету всем из листа ожидания, кому она подходит, одним проходом:
+    кого уведомили, снимаем с ожидания одним UPDATE, просмотры пишем одним bulk_create.
     """
-    seen_ids = context.user_data.get("networking_seen_ids", set())
-
-    candidate = Participant.objects.filter(
-        # Ищем тех, у кого заполнена должность (считаем это признаком заполненной анкеты)
-        position__isnull=False
-    ).exclude(
-        position=''  # Исключаем пустые строки
-    ).exclude(
-        telegram_id=user_telegram_id  # Не показываем самого себя
-    ).exclude(
-        id__in=seen_ids  # Не показываем тех, кого уже видели
-    ).first()  # Берем первого попавшегося
-
-    if candidate:
-        # Добавляем ID найденного в список просмотренных
-        seen_ids.add(candidate.id)
-        context.user_data["networking_seen_ids"] = seen_ids
-
-        # Превращаем объект модели в словарь для функции отображения
-        return {
-            "full_name": candidate.full_name,
-            "username": candidate.username,
-            "role": candidate.position,
-            "experience": candidate.experience,
-            "looking_for": candidate.looking_for,
-        }
-
-    return None
\ No newline at end of file
+    engine = get_match_engine()
+    waiting = dict(
+        Participant.objects.filter(networking_waiting=True, bot_blocked=False)
+        .values_list('id', 'telegram_id')
+    )
+    # Кто уже видел эту анкету, не получает её повторно, когда её владелец что-то поправил
+    already_seen = set(
+        NetworkingSeen.objects.filter(viewer_id__in=waiting, candidate=candidate)
+        .values_list('viewer_id', flat=True)
+    )
+    matched = engine.interested_in(candidate.id, [pk for pk in waiting if pk not in already_seen])
+    if not matched:
+        return
+
+    card = _candidate_card({
+        "full_name": candidate.full_name,
+        "username": candidate.username,
+        "role": candidate.position,
+        "experience": candidate.experience,
+        "looking_for": candidate.looking_for,
+    })
+    text = (
+        "Появилась анкета, которая тебе может подойти:\n\n"
+        f"{card}"
+        "Чтобы посмотреть ещё людей, нажми «Нетворкинг»."
+    )
+
+    notified = []
+    blocked = []
+    for viewer_id in matched:
+        try:
+            bot.send_message(chat_id=waiting[viewer_id], text=text)
+        except Unauthorized:
+            blocked.append(viewer_id)
+            continue
+        except TelegramError as e:
+            logger.error(f"Error notifying waiting participant {viewer_id}: {e}")
+            continue
+        notified.append(viewer_id)
+        engine.mark_seen(viewer_id, candidate.id)
+
+    with transaction.atomic():
+        Participant.objects.filter(id__in=notified).update(networking_waiting=False)
+        Participant.objects.filter(id__in=blocked).update(bot_blocked=True)
+        NetworkingSeen.objects.bulk_create(
+            [NetworkingSeen(viewer_id=viewer_id, candidate_id=candidate.id) for viewer_id in notified],
+            ignore_conflicts=True,
+        )
+    logger.info(f"Sent new profile {candidate.id} to {len(notified)} waiting participants")
@@ -1,194 +1,418 @@
 import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 from django.conf import settings
-from telegram import Bot
+from django.db import DatabaseError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from telegram.error import BadRequest, NetworkError, TelegramError, Unauthorized
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
 
 from datacenter.models import Subscription, Notification, UserNotification, Participant
+from tg_bot.broadcasts import wake_worker
 from tg_bot.config import TELEGRAM_BOT_TOKEN
+from tg_bot.ratelimit import build_bot
 
 
 logger = logging.getLogger(__name__)
 
+
+def _not_sent(error):
+    """Сетевая ошибка случилась до отправки запроса: не удалось установить соединение."""
+    cause = error.__cause__
+    if isinstance(cause, MaxRetryError):
+        cause = cause.reason
+    # NewConnectionError — тоже наследник ConnectTimeoutError
+    return isinstance(cause, ConnectTimeoutError)
+
+
+class DeliveryRecorder:
+    """Копит записи о доставке и сохраняет их пачками через bulk_create."""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.lock = threading.Lock()
+
+    def add(self, participant, notification, status='sent', attempts=1, error=''):
+        with self.lock:
+            self.buffer.append(
+                UserNotification(
+                    participant=participant,
+                    notification=notification,
+                    status=status,
+                    attempts=attempts,
+                    error=error,
+                )
+            )
+            is_full = len(self.buffer) >= self.chunk_size
+        if is_full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            records, self.buffer = self.buffer, []
+        if not records:
+            return
+
+        with transaction.atomic():
+            # Участника могли удалить, пока шла отправка: его запись уронила бы всю пачку.
+            # Блокировка не даст удалить остальных до конца записи
+            existing = set(
+                Participant.objects.select_for_update()
+                .filter(id__in={record.participant_id for record in records})
+                .values_list('id', flat=True)
+            )
+            UserNotification.objects.bulk_create(
+                [record for record in records if record.participant_id in existing],
+                batch_size=self.chunk_size,
+            )
+
+
 class NotificationService:
-    def __init__(self, bot):
+    def __init__(self, bot, max_workers=None):
         self.bot = bot
+        self.max_workers = max_workers or settings.NOTIFICATION_SETTINGS["delivery_workers"]
+        # HTTP-запросы идут параллельно, а темп задаёт общий RateLimiter бота
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="notification-sender",
+        )
+        self.recorder = DeliveryRecorder(
+            chunk_size=settings.NOTIFICATION_SETTINGS["delivery_records_chunk_size"]
+        )
     
-    def send_program_change_notification(self, event, change_description):
+    def deliver(self, notification):
+        handlers = {
+            'program_change': self.send_program_change_notification,
+            'new_event': self.send_new_event_notification,
+            'reminder': self.send_reminder_notification,
+        }
+        handler = handlers.get(notification.notification_type)
+        if not handler:
+            logger.warning(f"Unsupported notification type {notification.notification_type}")
+        else:
+            handler(notification)
+        self.recorder.flush()
+
+        notification.status = 'sent'
+        notification.is_sent = True
+        notification.save(update_fields=['status', 'is_sent'])
+        return notification.sent_count
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.recorder.flush()
+
+    def _send_to_participants(self, notification, participants, text, parse_mode=None, prepare_batch=None):
+        """
+        Рассылает текст участникам пачками по broadcast_batch_size в порядке id.
+        После каждой пачки записи о доставке и курсор фиксируются одной транзакцией,
+        поэтому перезапущенный воркер продолжит с первой неотправленной пачки.
+        """
+        if notification.total_recipients is None:
+            notification.total_recipients = participants.count()
+            notification.save(update_fields=['total_recipients'])
+
+        batch_size = settings.NOTIFICATION_SETTINGS["broadcast_batch_size"]
+        participants = participants.only('id', 'telegram_id').order_by('id')
+        while True:
+            batch = list(participants.filter(id__gt=notification.cursor)[:batch_size])
+            if not batch:
+                break
+            if prepare_batch:
+                prepare_batch(batch)
+            self._send_batch(notification, batch, text, parse_mode)
+
+        return notification.sent_count
+
+    def _send_batch(self, notification, participants, text, parse_mode):
+        # HTTP-запросы идут в пуле потоков, запись в БД остаётся в вызывающем потоке
+        futures = [
+            self.executor.submit(self._send_with_retry, participant.telegram_id, text, parse_mode)
+            for participant in participants
+        ]
+        sent_count = sum(
+            self._record_delivery(future, participant, notification)
+            for future, participant in zip(futures, participants)
+        )
+
+        with transaction.atomic():
+            try:
+                self.recorder.flush()
+            except DatabaseError as e:
+                # Сообщения уже ушли: без записей о доставке обойдёмся,
+                # а откат курсора разослал бы пачку повторно
+                logger.error(f"Error saving delivery records for notification {notification.id}: {e}")
+            notification.cursor = participants[-1].id
+            notification.sent_count += sent_count
+            notification.heartbeat_at = timezone.now()
+            notification.save(update_fields=['cursor', 'sent_count', 'heartbeat_at'])
+
+    def _send_with_retry(self, chat_id, text, parse_mode):
+        """
+        Повторяет с экспоненциальной задержкой и джиттером только ошибки соединения:
+        такой запрос точно не дошёл до Telegram. После таймаута ответа сообщение
+        могло быть доставлено, поэтому его не повторяем, чтобы не прислать дубль.
+        Возвращает статус доставки, число попыток и текст ошибки.
+        """
+        max_retries = settings.NOTIFICATION_SETTINGS["max_retries"]
+        base_delay = settings.NOTIFICATION_SETTINGS["retry_base_delay_seconds"]
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return 'sent', attempt, ''
+            except Unauthorized as e:
+                # Пользователь заблокировал бота или удалил аккаунт
+                return 'blocked', attempt, str(e)
+            except BadRequest as e:
+                return 'failed', attempt, str(e)
+            except NetworkError as e:
+                if attempt > max_retries or not _not_sent(e):
+                    return 'failed', attempt, str(e)
+                time.sleep(random.uniform(0, base_delay * 2 ** (attempt - 1)))
+            except TelegramError as e:
+                return 'failed', attempt, str(e)
+
+    def _record_delivery(self, future, participant, notification):
+        try:
+            status, attempts, error = future.result()
+        except Exception as e:
+            status, attempts, error = 'failed', 1, str(e)
+
+        if status == 'blocked':
+            # Следующие рассылки пропустят этого участника без запроса к Telegram
+            Participant.objects.filter(id=participant.id).update(bot_blocked=True)
+        if status != 'sent':
+            logger.error(f"Failed to send notification to {participant.telegram_id}: {error}")
+
+        self.recorder.add(participant, notification, status=status, attempts=attempts, error=error)
+        return 1 if status == 'sent' else 0
+
+    def send_program_change_notification(self, notification):
+        event = notification.event
         try:
-            subscriptions = Subscription.objects.filter(
-                event=event,
-                notify_program_changes=True
-            ).select_related('participant')
+            participants = Participant.objects.filter(
+                subscription__event=event,
+                subscription__notify_program_changes=True,
+                bot_blocked=False
+            )
             
-            if not subscriptions.exists():
+            if not participants.exists():
                 logger.info(f"No subscribers for program changes in event {event.title}")
                 return 0
             
-            notification = Notification.objects.create(
-                event=event,
-                title=f"Изменения в программе {event.title}",
-                message=change_description,
-                notification_type='program_change'
+            message_text = (
+                f"*Изменения в программе*\n\n"
+                f"*{event.title}*\n\n"
+                f"{notification.message}\n\n"
+                f"Используй /program чтобы посмотреть актуальное расписание"
+            )
+            sent_count = self._send_to_participants(
+                notification, participants, message_text, parse_mode='Markdown'
             )
-            
-            sent_count = 0
-            for subscription in subscriptions:
-                try:
-                    message_text = (
-                        f"*Изменения в программе*\n\n"
-                        f"*{event.title}*\n\n"
-                        f"{change_description}\n\n"
-                        f"Используй /program чтобы посмотреть актуальное расписание"
-                    )
-                    
-                    self.bot.send_message(
-                        chat_id=subscription.participant.telegram_id,
-                        text=message_text,
-                        parse_mode='Markdown'
-                    )
-                    
-                    UserNotification.objects.create(
-                        participant=subscription.participant,
-                        notification=notification
-                    )
-                    sent_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Failed to send notification to {subscription.participant.telegram_id}: {e}")
-            
-            notification.is_sent = True
-            notification.save()
             
             logger.info(f"Sent {sent_count} program change notifications for event {event.title}")
             return sent_count
             
         except Exception as e:
             logger.error(f"Error sending program change notifications: {e}")
-            return 0
+            raise
 
     
-    def send_new_event_notification(self, event):
+    def send_new_event_notification(self, notification):
+        event = notification.event
         try:
-            participants = Participant.objects.all()
-
-            if not participants.exists:
-                logger.info(f"No subscribers for events")
-            
-            notification = Notification.objects.create(
-                event=event,
-                title=f"Новое мероприятие: {event.title}",
-                message=event.description,
-                notification_type='new_event'
+            message_text = (
+                f"*Новое мероприятие!*\n\n"
+                f"*{event.title}*\n\n"
+                f"{event.description}\n\n"
+                f"Дата: {event.date.strftime('%d.%m.%Y %H:%M')}\n\n"
+                f"Используй /subscribe чтобы подписаться на уведомления об этом мероприятии"
+            )
+            sent_count = self._send_to_participants(
+                notification,
+                self._new_event_recipients(),
+                message_text,
+                parse_mode="Markdown",
+                prepare_batch=lambda batch: self._subscribe_to_event(event, batch)
             )
-            
-            sent_count = 0
-            for participant in participants:
-                try:
-                    has_new_events_enabled = Subscription.objects.filter(
-                        participant=participant,
-                        notify_new_events=True
-                    ).exists()
-
-                    if not Subscription.objects.filter(participant=participant).exists():
-                        has_new_events_enabled = True
-                
-                    if not has_new_events_enabled:
-                        continue
-                
-                    subscription, created = Subscription.objects.get_or_create(
-                        participant=participant,
-                        event=event,
-                        defaults={
-                            'notify_program_changes': True,
-                            'notify_new_events': True,
-                            'notify_reminders': True
-                        }
-                    )
-                
-                    message_text = (
-                        f"*Новое мероприятие!*\n\n"
-                        f"*{event.title}*\n\n"
-                        f"{event.description}\n\n"
-                        f"Дата: {event.date.strftime('%d.%m.%Y %H:%M')}\n\n"
-                        f"Используй /subscribe чтобы подписаться на уведомления об этом мероприятии"
-                    )
-                
-                    self.bot.send_message(
-                        chat_id=participant.telegram_id,
-                        text=message_text,
-                        parse_mode="Markdown"
-                    )
-                
-                    UserNotification.objects.create(
-                        participant=participant,
-                        notification=notification
-                    )
-                
-                    sent_count += 1
-                    logger.info(f"Sent new event notification to {participant.telegram_id}")
-                
-                except Exception as e:
-                    logger.error(f"Failed to send new event notification to {participant.telegram_id}: {e}")
-        
-            notification.is_sent = True
-            notification.save()
         
             logger.info(f"Sent {sent_count} new event notifications for event {event.title}")
             return sent_count
         
         except Exception as e:
             logger.error(f"Error sending new event notifications: {e}")
-            return 0
+            raise
+
+    def _new_event_recipients(self):
+        """
+        Получатели анонса: все, у кого ещё нет подписок, и те,
+        у кого хотя бы в одной подписке включены новые мероприятия.
+        """
+        subscriptions = Subscription.objects.filter(participant=OuterRef('pk'))
+        return Participant.objects.filter(
+            Exists(subscriptions.filter(notify_new_events=True)) | ~Exists(subscriptions),
+            bot_blocked=False
+        )
+
+    def _subscribe_to_event(self, event, participants):
+        Subscription.objects.bulk_create(
+            [
+                Subscription(
+                    participant=participant,
+                    event=event,
+                    notify_program_changes=True,
+                    notify_new_events=True,
+                    notify_reminders=True,
+                )
+                for participant in participants
+            ],
+            ignore_conflicts=True,
+        )
 
     
-    def send_reminder_notification(self, event, speech=None):
+    def send_reminder_notification(self, notification):
         try:
-            subscriptions = Subscription.objects.filter(
-                event=event,
-                notify_reminders=True
-            ).select_related('participant')
-            
-            if speech:
-                message = f"*Скоро начнется выступление!*\n\n{speech.speaker.name}\n*{speech.title}*\n\nНачало: {speech.start_time.strftime('%H:%M')}"
-                title = f"Напоминание: {speech.title}"
-            else:
-                message = f"*Скоро начнется мероприятие!*\n\n{event.title}\n\nНачало: {event.date.strftime('%H:%M')}"
-                title = f"Напоминание: {event.title}"
-            
-            notification = Notification.objects.create(
-                event=event,
-                title=title,
-                message=message,
-                notification_type='reminder'
+            participants = Participant.objects.filter(
+                subscription__event=notification.event,
+                subscription__notify_reminders=True,
+                bot_blocked=False
             )
             
-            sent_count = 0
-            for subscription in subscriptions:
-                try:
-                    self.bot.send_message(
-                        chat_id=subscription.participant.telegram_id,
-                        text=message
-                    )
-                    UserNotification.objects.create(
-                        participant=subscription.participant,
-                        notification=notification
-                    )
-                    sent_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send reminder to {subscription.participant.telegram_id}: {e}")
-            
-            notification.is_sent = True
-            notification.save()
+            sent_count = self._send_to_participants(notification, participants, notification.message)
             
             logger.info(f"Sent {sent_count} reminder notifications")
             return sent_count
             
         except Exception as e:
             logger.error(f"Error sending reminder notifications: {e}")
-            return 0
+            raise
+
+
+def _enqueue_notification(**fields):
+    notification = Notification.objects.create(**fields)
+    # Публикуем только после коммита: при откате изменения никто ничего не получит
+    transaction.on_commit(wake_worker)
+    return notification
+
+
+MORE_CHANGES_PREFIX = "Ещё изменений: "
+
+
+def _append_program_change(message, change_description, max_length):
+    """
+    Добавляет изменение в накопленный текст. Повторы пропускаются, а когда текст
+    дорастает до max_length, вместо новых строк растёт счётчик «Ещё изменений: N»,
+    чтобы сообщение не упёрлось в лимит Telegram в 4096 символов.
+    """
+    if change_description in message:
+        return message
+
+    body, separator, more = message.rpartition(f"\n{MORE_CHANGES_PREFIX}")
+    if separator and more.isdigit():
+        more_count = int(more)
+    else:
+        body, more_count = message, 0
+
+    if not more_count and len(body) + 1 + len(change_description) <= max_length:
+        return f"{body}\n{change_description}"
+    return f"{body}\n{MORE_CHANGES_PREFIX}{more_count + 1}"
+
+
+def enqueue_program_change_notification(event, change_description):
+    """
+    Изменения одного мероприятия копятся в окне program_change_window_seconds
+    и уходят подписчикам одним сообщением.
+    """
+    now = timezone.now()
+    max_length = settings.NOTIFICATION_SETTINGS["program_change_max_length"]
+    with transaction.atomic():
+        # Дописываем в ещё не отправленное уведомление, пока его окно открыто
+        pending = Notification.objects.select_for_update().filter(
+            event=event,
+            notification_type='program_change',
+            status='pending',
+            scheduled_for__gt=now,
+            # Отложенную после ошибки рассылку часть людей уже могла получить
+            attempts=0,
+        ).first()
+        if pending:
+            message = _append_program_change(pending.message, change_description, max_length)
+            if message != pending.message:
+                pending.message = message
+                pending.save(update_fields=['message'])
+            return None
+
+        window = settings.NOTIFICATION_SETTINGS["program_change_window_seconds"]
+        return _enqueue_notification(
+            event=event,
+            title=f"Изменения в программе {event.title}",
+            message=change_description[:max_length],
+            notification_type='program_change',
+            scheduled_for=now + timedelta(seconds=window),
+        )
+
+
+def enqueue_new_event_notification(event):
+    return _enqueue_notification(
+        event=event,
+        title=f"Новое мероприятие: {event.title}",
+        message=event.description,
+        notification_type='new_event'
+    )
+
+
+def enqueue_reminder_notification(event, speech=None):
+    if speech:
+        message = f"*Скоро начнется выступление!*\n\n{speech.speaker.name}\n*{speech.title}*\n\nНачало: {timezone.localtime(speech.start_time).strftime('%H:%M')}"
+        title = f"Напоминание: {speech.title}"
+    else:
+        message = f"*Скоро начнется мероприятие!*\n\n{event.title}\n\nНачало: {timezone.localtime(event.date).strftime('%H:%M')}"
+        title = f"Напоминание: {event.title}"
+
+    return _enqueue_notification(
+        event=event,
+        speech=speech,
+        title=title,
+        message=message,
+        notification_type='reminder'
+    )
+
+
+_notification_service = None
+_notification_service_lock = threading.Lock()
+
+
+def _reset_notification_service():
+    # Потоки рассылки и соединения родителя в дочернем процессе не работают
+    global _notification_service, _notification_service_lock
+    _notification_service = None
+    _notification_service_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_notification_service)
+
 
 def get_notification_service():
+    """Один сервис (и один бот с пулом соединений) на процесс, создаётся при первом вызове."""
+    global _notification_service
     if not TELEGRAM_BOT_TOKEN:
         logger.warning("TELEGRAM_BOT_TOKEN not set. Notification service will not work.")
         return None
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
-    return NotificationService(bot)
+
+    with _notification_service_lock:
+        if _notification_service is None:
+            bot = build_bot(
+                con_pool_size=settings.TELEGRAM_SETTINGS["connection_pool_size"], role="notifier"
+            )
+            _notification_service = NotificationService(bot)
+        return _notification_service
@@ -0,0 +1,161 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import close_old_connections, transaction
+from telegram.ext import BasePersistence
+
+from datacenter.models import ConversationState
+
+
+logger = logging.getLogger(__name__)
+
+# Флаги, которые имеют смысл только внутри работающего процесса
+TRANSIENT_KEYS = {"networking_refilling"}
+
+
+def _encode_value(value):
+    if isinstance(value, (set, frozenset)):
+        return {"__set__": sorted(value, key=repr)}
+    raise TypeError(f"{type(value).__name__} is not serializable")
+
+
+def _decode_value(value):
+    if set(value) == {"__set__"}:
+        return set(value["__set__"])
+    return value
+
+
+def encode_user_data(data):
+    data = {key: value for key, value in data.items() if key not in TRANSIENT_KEYS}
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_encode_value)
+
+
+def decode_user_data(raw):
+    return json.loads(raw, object_hook=_decode_value)
+
+
+class DatabasePersistence(BasePersistence):
+    """
+    Хранит context.user_data в таблице ConversationState.
+
+    Диспетчер отдаёт сюда копию user_data после каждого апдейта, а мы только запоминаем её.
+    Раз в flush_interval секунд изменившиеся состояния сериализуются в компактный JSON
+    и пишутся одним upsert; пользователи, у которых ничего не поменялось, не пишутся вовсе.
+
+    Таблица читается только при запуске, поэтому писать в неё должен один процесс —
+    runbot (в режиме webhook тоже он, веб-воркеры состояний не трогают). Состояния
+    переживают перезапуск, но при падении процесса теряются изменения за последние
+    flush_interval секунд.
+    """
+
+    def __init__(self, flush_interval):
+        super().__init__(store_user_data=True, store_chat_data=False, store_bot_data=False)
+        self.flush_interval = flush_interval
+        self.dirty = {}
+        # Последний записанный JSON по каждому пользователю: с ним сравниваем при сбросе
+        self.saved = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def get_user_data(self):
+        user_data = defaultdict(dict)
+        for telegram_id, raw in ConversationState.objects.values_list('telegram_id', 'data').iterator():
+            try:
+                user_data[telegram_id] = decode_user_data(raw)
+                self.saved[telegram_id] = raw
+            except ValueError:
+                logger.warning(f"Skipping broken conversation state for {telegram_id}")
+        return user_data
+
+    def update_user_data(self, user_id, data):
+        with self.lock:
+            self.dirty[user_id] = data
+
+    def get_chat_data(self):
+        return defaultdict(dict)
+
+    def get_bot_data(self):
+        return {}
+
+    def get_conversations(self, name):
+        return {}
+
+    def update_chat_data(self, chat_id, data):
+        pass
+
+    def update_bot_data(self, data):
+        pass
+
+    def update_conversation(self, name, key, new_state):
+        pass
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="conversation-state", daemon=True)
+        self.thread.start()
+
+    def flush(self):
+        """Вызывается и по таймеру, и самим Updater при остановке бота."""
+        with self.flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+        if not dirty:
+            return 0
+
+        changed = {}
+        for telegram_id, data in dirty.items():
+            try:
+                raw = encode_user_data(data)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Can't serialize conversation state for {telegram_id}: {e}")
+                continue
+            if self.saved.get(telegram_id, "{}") != raw:
+                changed[telegram_id] = raw
+        if not changed:
+            return 0
+
+        empty = [telegram_id for telegram_id, raw in changed.items() if raw == "{}"]
+        try:
+            with transaction.atomic():
+                ConversationState.objects.bulk_create(
+                    [
+                        ConversationState(telegram_id=telegram_id, data=raw)
+                        for telegram_id, raw in changed.items()
+                        if raw != "{}"
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['telegram_id'],
+                    update_fields=['data', 'updated_at'],
+                    batch_size=500,
+                )
+                if empty:
+                    ConversationState.objects.filter(telegram_id__in=empty).delete()
+        except Exception:
+            # Не теряем состояния: более свежие, пришедшие за время записи, важнее
+            with self.lock:
+                for telegram_id, data in dirty.items():
+                    self.dirty.setdefault(telegram_id, data)
+            raise
+
+        self.saved.update(changed)
+        return len(changed)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error saving conversation state: {e}")
@@ -0,0 +1,196 @@
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from datacenter.models import Event, Speech
+
+
+PROGRAM_VERSION_KEY = "program:version"
+
+# Версия из общего кэша и когда её читали (time.monotonic), и программа, отрисованная под версию
+_local_version = None
+_local_version_checked_at = 0
+_local_program = None
+_local_lock = threading.Lock()
+
+
+def get_program_version():
+    """
+    Версия программы в общем кэше. Меняется при любом изменении мероприятий и выступлений,
+    поэтому всё, что закэшировано под старой версией, больше не используется.
+
+    Общий кэш по умолчанию лежит в БД, поэтому процесс помнит версию у себя
+    и перечитывает её не чаще раза в program_version_check_seconds.
+    """
+    global _local_version, _local_version_checked_at
+    now = time.monotonic()
+    with _local_lock:
+        interval = settings.BOT_SETTINGS["program_version_check_seconds"]
+        if _local_version is not None and now - _local_version_checked_at < interval:
+            return _local_version
+
+    version = cache.get(PROGRAM_VERSION_KEY)
+    if version is None:
+        # add не перетрёт версию, если её успел записать другой процесс
+        cache.add(PROGRAM_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(PROGRAM_VERSION_KEY)
+
+    with _local_lock:
+        _local_version, _local_version_checked_at = version, now
+    return version
+
+
+def invalidate_program():
+    global _local_version
+    version = uuid.uuid4().hex
+    cache.set(PROGRAM_VERSION_KEY, version, timeout=None)
+    with _local_lock:
+        _local_version = version
+
+
+def _format_datetime(dt):
+    if not dt:
+        return "Не указано"
+    local_dt = timezone.localtime(dt)
+    return local_dt.strftime("%d.%m.%Y %H:%M")
+
+
+def _load_program():
+    has_events = Event.objects.filter(is_active=True).exists()
+    speeches = Speech.objects.filter(
+        event__is_active=True
+    ).select_related("speaker", "event").order_by("start_time")
+
+    entries = []
+    for speech in speeches:
+        # Форматируем время: если начало и конец в один день, показываем дату только для начала
+        start_local = timezone.localtime(speech.start_time)
+        end_local = timezone.localtime(speech.end_time)
+
+        if start_local.date() == end_local.date():
+            time_range = f"{_format_datetime(speech.start_time)}-{end_local.strftime('%H:%M')}"
+        else:
+            time_range = f"{_format_datetime(speech.start_time)}-{_format_datetime(speech.end_time)}"
+
+        entries.append({
+            "event_id": speech.event_id,
+            "event_title": speech.event.title,
+            "start_time": speech.start_time,
+            "end_time": speech.end_time,
+            "text": (
+                f"{time_range}\n"
+                f"спикер - {speech.speaker.name}\n"
+                f"тема: {speech.title}\n\n"
+            ),
+        })
+
+    return {"has_events": has_events, "speeches": entries}
+
+
+def get_program():
+    """Программа активных мероприятий, уже отформатированная, кроме статуса выступлений."""
+    global _local_program
+    version = get_program_version()
+    now = time.monotonic()
+    ttl = settings.BOT_SETTINGS["program_cache_seconds"]
+    with _local_lock:
+        if _local_program is not None:
+            program_version, rendered_at, program = _local_program
+            if program_version == version and now - rendered_at < ttl:
+                return program
+
+    key = f"program:rendered:{version}"
+    program = cache.get(key)
+    if program is None:
+        program = _load_program()
+        cache.set(key, program, timeout=ttl)
+
+    with _local_lock:
+        _local_program = (version, now, program)
+    return program
+
+
+class SpeechIntervalIndex:
+    """Выступления на сегодня, отсортированные по началу, для поиска текущего через bisect."""
+
+    def __init__(self, speeches, version, valid_until):
+        self.speeches = sorted(speeches, key=lambda speech: speech.start_time)
+        self.speech_ids = {speech.id for speech in self.speeches}
+        self.starts = [speech.start_time for speech in self.speeches]
+        # max_ends[i] — самый поздний конец среди первых i + 1 выступлений
+        self.max_ends = []
+        for speech in self.speeches:
+            latest_end = self.max_ends[-1] if self.max_ends else speech.end_time
+            self.max_ends.append(max(latest_end, speech.end_time))
+        self.version = version
+        self.valid_until = valid_until
+
+    def find(self, now):
+        index = bisect_right(self.starts, now)
+        while index > 0:
+            index -= 1
+            if self.max_ends[index] < now:
+                break
+            if self.speeches[index].end_time >= now:
+                return self.speeches[index]
+        return None
+
+    def next_boundary(self, now):
+        boundaries = [
+            moment
+            for speech in self.speeches
+            for moment in (speech.start_time, speech.end_time)
+            if moment > now
+        ]
+        return min(boundaries, default=None)
+
+
+_speech_index = None
+_speech_index_lock = threading.Lock()
+
+
+def _build_speech_index(version, now):
+    local_now = timezone.localtime(now)
+    day_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+
+    speeches = list(
+        Speech.objects.filter(start_time__lt=day_end, end_time__gte=day_start)
+        .select_related("speaker")
+    )
+    index = SpeechIntervalIndex(speeches, version, valid_until=day_end)
+
+    # Перестраиваемся на ближайшей границе выступления и не реже, чем раз в TTL кэша программы,
+    # чтобы подхватить правки из админки, сделанные в другом процессе
+    ttl = timedelta(seconds=settings.BOT_SETTINGS["program_cache_seconds"])
+    candidates = [day_end, now + ttl, index.next_boundary(now)]
+    index.valid_until = min(moment for moment in candidates if moment)
+    return index
+
+
+def _get_speech_index(now):
+    global _speech_index
+    version = get_program_version()
+
+    with _speech_index_lock:
+        index = _speech_index
+        if index is None or index.version != version or now >= index.valid_until:
+            index = _build_speech_index(version, now)
+            _speech_index = index
+    return index
+
+
+def find_active_speech(now=None):
+    now = now or timezone.now()
+    return _get_speech_index(now).find(now)
+
+
+def is_speech_scheduled_today(speech_id, now=None):
+    """Есть ли выступление в сегодняшней программе: проверка без запроса к БД."""
+    return speech_id in _get_speech_index(now or timezone.now()).speech_ids
@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from telegram.error import TelegramError, Unauthorized
+
+from datacenter.models import Participant, Question, Speaker, Speech
+from tg_bot.clustering import QuestionClusterer
+from tg_bot.program import find_active_speech
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько вопросов читаем из БД за раз и сколько символов влезает в одно сообщение Telegram
+DIGEST_PAGE_SIZE = 50
+MESSAGE_MAX_LENGTH = 4096
+
+
+def format_question(question):
+    participant = question.participant
+    username = participant.username or "ник не указан"
+    name = participant.full_name or username
+    contact = f"@{username}" if participant.username else "контакт: ник не указан"
+    stats = []
+    if question.votes:
+        stats.append(f"голосов: {question.votes}")
+    if question.duplicates_count:
+        stats.append(f"+{question.duplicates_count} похожих")
+    stats_line = f"   ({', '.join(stats)})\n" if stats else ""
+    return (
+        f"От {name} ({contact}):\n"
+        f"   {question.question_text}\n"
+        f"{stats_line}"
+    )
+
+
+class QuestionBuffer:
+    """
+    Принимает вопросы без обращения к БД: запись сначала попадает в журнал на диске,
+    а в БД вопросы уходят пачкой через bulk_create раз в flush_interval секунд
+    или как только накопится flush_size штук.
+
+    После падения журнал проигрывается заново; повторно вставленные вопросы
+    отсекаются по уникальному uid.
+    """
+
+    def __init__(self, journal_path, flush_size, flush_interval):
+        self.journal_path = str(journal_path)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.listeners = []
+
+        self.pending = self._read_journal()
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        if self.pending:
+            logger.info(f"Replaying {len(self.pending)} questions from journal")
+
+    def submit(self, speech_id, user, question_text):
+        record = {
+            "uid": uuid.uuid4().hex,
+            "speech_id": speech_id,
+            "telegram_id": user.id,
+            "username": user.username or "",
+            "full_name": f"{user.first_name} {user.last_name or ''}".strip(),
+            "text": question_text,
+            "created_at": timezone.now().isoformat(),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self.lock:
+            self.journal.write(line)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.pending.append(record)
+            if len(self.pending) >= self.flush_size:
+                self.wakeup.set()
+        return record
+
+    def add_listener(self, callback):
+        """callback(records) вызывается после того, как пачка вопросов записана в БД."""
+        self.listeners.append(callback)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="question-buffer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+        self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                records = list(self.pending)
+            if not records:
+                return 0
+
+            self._save(records)
+
+            with self.lock:
+                del self.pending[:len(records)]
+                # В журнале остаются только вопросы, пришедшие во время записи в БД
+                self._rewrite_journal(self.pending)
+
+            for callback in self.listeners:
+                try:
+                    callback(records)
+                except Exception as e:
+                    logger.error(f"Error in question buffer listener: {e}")
+            return len(records)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                # Вопросы остаются в памяти и в журнале, попробуем в следующий раз
+                logger.error(f"Error flushing questions: {e}")
+
+    def _save(self, records):
+        telegram_ids = {record["telegram_id"] for record in records}
+        speech_ids = {record["speech_id"] for record in records}
+
+        with transaction.atomic():
+            existing = set(
+                Participant.objects.filter(telegram_id__in=telegram_ids)
+                .values_list('telegram_id', flat=True)
+            )
+            new_participants = {}
+            for record in records:
+                if record["telegram_id"] not in existing:
+                    new_participants[record["telegram_id"]] = Participant(
+                        telegram_id=record["telegram_id"],
+                        username=record["username"],
+                        full_name=record["full_name"],
+                    )
+            Participant.objects.bulk_create(new_participants.values(), ignore_conflicts=True)
+
+            participant_ids = dict(
+                Participant.objects.filter(telegram_id__in=telegram_ids)
+                .values_list('telegram_id', 'id')
+            )
+            existing_speeches = set(
+                Speech.objects.filter(id__in=speech_ids).values_list('id', flat=True)
+            )
+
+            questions = []
+            for record in records:
+                if record["speech_id"] not in existing_speeches:
+                    logger.warning(f"Dropping question {record['uid']}: speech {record['speech_id']} not found")
+                    continue
+                questions.append(Question(
+                    uid=record["uid"],
+                    speech_id=record["speech_id"],
+                    participant_id=participant_ids[record["telegram_id"]],
+                    question_text=record["text"],
+                    created_at=parse_datetime(record["created_at"]),
+                ))
+            Question.objects.bulk_create(questions, ignore_conflicts=True)
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+
+        records = []
+        with open(self.journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Строка, которую не успели дописать перед падением
+                    logger.warning("Skipping truncated question journal line")
+        return records
+
+    def _rewrite_journal(self, records):
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as tmp:
+            for record in records:
+                tmp.write(json.dumps(record, ensure_ascii=False) + "\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+
+        self.journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+
+class SpeakerDigestPusher:
+    """
+    Присылает спикеру новые вопросы к его текущему выступлению дайджестами:
+    раз в interval секунд или сразу, как наберётся batch_size новых вопросов.
+    Курсор last_pushed_question_id двигается после каждого отправленного сообщения,
+    поэтому каждый вопрос читается из БД и уходит спикеру один раз.
+    """
+
+    def __init__(self, bot, interval, batch_size):
+        self.bot = bot
+        self.interval = interval
+        self.batch_size = batch_size
+        # Новые вопросы по выступлениям с прошлого дайджеста; None — проверить всё
+        self.new_questions = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def questions_saved(self, records):
+        with self.lock:
+            if self.new_questions is None:
+                return
+            for record in records:
+                self.new_questions[record["speech_id"]] += 1
+            if max(self.new_questions.values(), default=0) >= self.batch_size:
+                self.wakeup.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="speaker-digest", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            close_old_connections()
+            try:
+                self.push_digests()
+            except Exception as e:
+                logger.error(f"Error pushing questions to speaker: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def push_digests(self):
+        speech = find_active_speech()
+
+        with self.lock:
+            new_questions = self.new_questions
+            self.new_questions = defaultdict(int)
+        if speech is None:
+            return 0
+        if new_questions is not None and not new_questions.get(speech.id):
+            return 0
+
+        speaker = Speaker.objects.filter(
+            id=speech.speaker_id, questions_push_enabled=True, telegram_id__isnull=False
+        ).first()
+        if speaker is None:
+            return 0
+
+        sent = 0
+        while True:
+            questions = list(
+                Question.objects.filter(
+                    speech=speech, id__gt=speaker.last_pushed_question_id, duplicate_of__isnull=True
+                )
+                .select_related("participant")
+                .order_by("id")[:DIGEST_PAGE_SIZE]
+            )
+            if not questions:
+                return sent
+
+            for chunk in self._split_into_messages(speech, questions):
+                try:
+                    self.bot.send_message(chat_id=speaker.telegram_id, text=chunk["text"])
+                except Unauthorized:
+                    # Спикер заблокировал бота — перестаём слать, пока он не включит снова
+                    Speaker.objects.filter(id=speaker.id).update(questions_push_enabled=False)
+                    logger.warning(f"Speaker {speaker.id} blocked the bot, question push disabled")
+                    return sent
+                except TelegramError as e:
+                    logger.error(f"Error pushing questions to speaker {speaker.id}: {e}")
+                    return sent
+
+                speaker.last_pushed_question_id = chunk["last_id"]
+                Speaker.objects.filter(id=speaker.id).update(last_pushed_question_id=chunk["last_id"])
+                sent += chunk["count"]
+
+    def _split_into_messages(self, speech, questions):
+        header = f"Новые вопросы к докладу «{speech.title}»:\n\n"
+        chunk = {"text": header, "last_id": None, "count": 0}
+        for question in questions:
+            line = format_question(question) + "\n"
+            if chunk["count"] and len(chunk["text"]) + len(line) > MESSAGE_MAX_LENGTH:
+                yield chunk
+                chunk = {"text": header, "last_id": None, "count": 0}
+            chunk["text"] += line[:MESSAGE_MAX_LENGTH - len(header)]
+            chunk["last_id"] = question.id
+            chunk["count"] += 1
+        yield chunk
+
+
+_question_buffer = None
+_question_buffer_lock = threading.Lock()
+
+
+def get_question_buffer():
+    global _question_buffer
+    with _question_buffer_lock:
+        if _question_buffer is None:
+            bot_settings = settings.BOT_SETTINGS
+            _question_buffer = QuestionBuffer(
+                journal_path=bot_settings["questions_journal_path"],
+                flush_size=bot_settings["questions_flush_size"],
+                flush_interval=bot_settings["questions_flush_interval_ms"] / 1000,
+            )
+            _question_buffer.add_listener(QuestionClusterer().questions_saved)
+            _question_buffer.start()
+        return _question_buffer
+
+
+def start_speaker_digests(bot):
+    """Запускает дайджесты вопросов спикерам и подписывает их на сбросы буфера вопросов."""
+    digest_pusher = SpeakerDigestPusher(
+        bot,
+        interval=settings.BOT_SETTINGS["questions_push_interval_seconds"],
+        batch_size=settings.BOT_SETTINGS["questions_push_batch_size"],
+    )
+    get_question_buffer().add_listener(digest_pusher.questions_saved)
+    digest_pusher.start()
+    return digest_pusher
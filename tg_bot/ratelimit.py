@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.utils.request import Request
+
+from tg_bot.config import TELEGRAM_BOT_TOKEN
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Корзина токенов: `rate` сообщений в секунду с запасом `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, now):
+        """Резервирует токен и возвращает, сколько секунд нужно подождать."""
+        elapsed = max(0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = max(self.updated_at, now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return max(0, self.updated_at - now)
+        return self.updated_at - now - self.tokens / self.rate
+
+    def is_idle(self, now):
+        return self.tokens + max(0, now - self.updated_at) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """
+    Общий лимит Telegram на бота и отдельные лимиты на каждый чат.
+    Без chat_rate лимит чатов не соблюдается, остаётся только общий.
+    """
+
+    def __init__(self, global_rate, global_burst, chat_rate=None, chat_burst=None):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, chat_id):
+        with self.lock:
+            now = time.monotonic()
+            chat_wait = 0
+            if self.chat_rate:
+                # Сначала ждём свою очередь в чате, а потом занимаем общий слот,
+                # чтобы не держать общий токен, пока чат упирается в свой лимит
+                chat_wait = self._chat_bucket(chat_id, now).reserve(now)
+            wait = chat_wait + self.global_bucket.reserve(now + chat_wait)
+            wait = max(wait, self.paused_until - now)
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Telegram попросил подождать (RetryAfter) — придерживаем все отправки."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _chat_bucket(self, chat_id, now):
+        chat_bucket = self.chat_buckets.get(chat_id)
+        if chat_bucket is None:
+            chat_bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = chat_bucket
+            if len(self.chat_buckets) > 10000:
+                self._forget_idle_chats(now)
+        return chat_bucket
+
+    def _forget_idle_chats(self, now):
+        self.chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self.chat_buckets.items()
+            if not bucket.is_idle(now)
+        }
+
+
+_rate_limiters = {}
+_rate_limiter_lock = threading.Lock()
+
+
+def _reset_rate_limiter():
+    global _rate_limiters, _rate_limiter_lock
+    _rate_limiters = {}
+    _rate_limiter_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_rate_limiter)
+
+
+def get_rate_limiter(role):
+    """
+    Лимитер процесса с долей общего лимита бота, отведённой роли ('bot' или 'notifier').
+
+    Лимит чата соблюдают только рассылки. Бот отвечает из потока диспетчера, и ожидание
+    в нём из-за одного частящего пользователя задержало бы ответы всем остальным.
+    """
+    with _rate_limiter_lock:
+        rate_limiter = _rate_limiters.get(role)
+        if rate_limiter is None:
+            limits = settings.TELEGRAM_SETTINGS
+            per_chat = role == "notifier"
+            rate_limiter = RateLimiter(
+                global_rate=limits["global_messages_per_second"][role],
+                global_burst=limits["global_burst"][role],
+                chat_rate=limits["chat_messages_per_second"] if per_chat else None,
+                chat_burst=limits["chat_burst"] if per_chat else None,
+            )
+            _rate_limiters[role] = rate_limiter
+        return rate_limiter
+
+
+class RateLimitedBot(ExtBot):
+    """Бот, который пропускает все send_message через общий RateLimiter."""
+
+    def __init__(self, *args, rate_limiter, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def send_message(self, chat_id, *args, **kwargs):
+        while True:
+            self.rate_limiter.acquire(chat_id)
+            try:
+                return super().send_message(chat_id, *args, **kwargs)
+            except RetryAfter as e:
+                # Сообщение не теряем: ждём, сколько сказал Telegram, и пробуем снова
+                logger.warning(f"Flood control for chat {chat_id}, retry in {e.retry_after}s")
+                self.rate_limiter.pause(e.retry_after)
+
+
+def build_bot(con_pool_size, role):
+    """
+    Создаёт бота с keep-alive пулом соединений и таймаутами из TELEGRAM_SETTINGS.
+    role выбирает долю общего лимита сообщений: 'bot' или 'notifier'.
+    """
+    telegram_settings = settings.TELEGRAM_SETTINGS
+    request = Request(
+        con_pool_size=con_pool_size,
+        connect_timeout=telegram_settings["connect_timeout"],
+        read_timeout=telegram_settings["read_timeout"],
+    )
+    return RateLimitedBot(
+        token=TELEGRAM_BOT_TOKEN,
+        base_url=telegram_settings["api_base_url"],
+        request=request,
+        rate_limiter=get_rate_limiter(role),
+    )
@@ -0,0 +1,199 @@
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from datacenter.models import Event, Notification, Speech
+from tg_bot.program import get_program_version
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """
+    Держит в куче время напоминаний о предстоящих выступлениях и мероприятиях
+    и спит до ближайшего. Когда срок наступает, ставит напоминание в очередь рассылки.
+
+    Программу меняют и в других процессах (админка), а сигналы оттуда сюда не доходят,
+    поэтому раз в version_check_interval секунд планировщик сверяет версию программы
+    в общем кэше и перечитывает напоминания из БД, только если она сменилась.
+    """
+
+    def __init__(self, lead_time, version_check_interval):
+        self.lead_time = lead_time
+        self.version_check_interval = version_check_interval
+        # Версия программы, под которую построена куча
+        self.version = None
+        self.heap = []
+        # Актуальное время для каждого ключа; записи в куче с другим временем устарели
+        self.due = {}
+        # Уже сработавшие (ключ, время): перечитывание не должно запускать их снова
+        self.fired = set()
+        self.event_speeches = defaultdict(set)
+        self.condition = threading.Condition()
+
+    def load(self):
+        # Версию берём до чтения БД: правка, закоммиченная посреди чтения, сменит её ещё раз
+        version = get_program_version()
+        now = timezone.now()
+        events = list(Event.objects.filter(is_active=True, date__gt=now).values_list('id', 'date'))
+        speeches = list(
+            Speech.objects.filter(event__is_active=True, start_time__gt=now)
+            .values_list('id', 'event_id', 'start_time')
+        )
+
+        with self.condition:
+            self.heap = []
+            self.due = {}
+            self.event_speeches = defaultdict(set)
+            self.fired = {(key, due_at) for key, due_at in self.fired if due_at > now - self.lead_time}
+            for event_id, date in events:
+                self._schedule(('event', event_id), date - self.lead_time)
+            for speech_id, event_id, start_time in speeches:
+                self._schedule(('speech', speech_id), start_time - self.lead_time)
+                self.event_speeches[event_id].add(speech_id)
+            self.version = version
+            self.condition.notify()
+
+        logger.debug(f"Reminder scheduler indexed {len(self.due)} reminders")
+
+    def reindex_event(self, event_id):
+        """Перечитывает одно мероприятие и его выступления вместо всей таблицы."""
+        now = timezone.now()
+        event_date = Event.objects.filter(
+            id=event_id, is_active=True, date__gt=now
+        ).values_list('date', flat=True).first()
+        speeches = Speech.objects.filter(
+            event_id=event_id, event__is_active=True, start_time__gt=now
+        ).values_list('id', 'start_time')
+
+        with self.condition:
+            self.due.pop(('event', event_id), None)
+            for speech_id in self.event_speeches.pop(event_id, set()):
+                self.due.pop(('speech', speech_id), None)
+
+            if event_date:
+                self._schedule(('event', event_id), event_date - self.lead_time)
+            for speech_id, start_time in speeches:
+                self._schedule(('speech', speech_id), start_time - self.lead_time)
+                self.event_speeches[event_id].add(speech_id)
+            self.condition.notify()
+
+    def run(self):
+        next_check = time.monotonic() + self.version_check_interval
+        while True:
+            if time.monotonic() >= next_check:
+                close_old_connections()
+                try:
+                    if get_program_version() != self.version:
+                        self.load()
+                except Exception as e:
+                    logger.error(f"Error reloading reminders: {e}")
+                next_check = time.monotonic() + self.version_check_interval
+
+            with self.condition:
+                now = timezone.now()
+                due_keys = self._pop_due(now)
+                if not due_keys:
+                    timeout = next_check - time.monotonic()
+                    if self.heap:
+                        timeout = min(timeout, (self.heap[0][0] - now).total_seconds())
+                    self.condition.wait(max(0, timeout))
+                    continue
+
+            close_old_connections()
+            for key in due_keys:
+                self._fire(key)
+
+    def _schedule(self, key, due_at):
+        if (key, due_at) in self.fired:
+            return
+        self.due[key] = due_at
+        heapq.heappush(self.heap, (due_at, key))
+
+    def _pop_due(self, now):
+        due_keys = []
+        while self.heap and self.heap[0][0] <= now:
+            due_at, key = heapq.heappop(self.heap)
+            if self.due.get(key) == due_at:
+                del self.due[key]
+                self.fired.add((key, due_at))
+                due_keys.append(key)
+        return due_keys
+
+    def _fire(self, key):
+        from tg_bot.notifications import enqueue_reminder_notification
+
+        kind, object_id = key
+        now = timezone.now()
+        try:
+            # Мероприятие могли снять с публикации или перенести, пока мы спали
+            if kind == 'speech':
+                speech = Speech.objects.select_related('event', 'speaker').filter(
+                    id=object_id, event__is_active=True
+                ).first()
+                if (
+                    speech
+                    and self._is_due(speech.start_time, now)
+                    and not self._already_reminded(speech.event, speech, speech.start_time)
+                ):
+                    enqueue_reminder_notification(speech.event, speech)
+            else:
+                event = Event.objects.filter(id=object_id, is_active=True).first()
+                if (
+                    event
+                    and self._is_due(event.date, now)
+                    and not self._already_reminded(event, None, event.date)
+                ):
+                    enqueue_reminder_notification(event)
+        except Exception as e:
+            logger.error(f"Error scheduling reminder for {kind} {object_id}: {e}")
+
+    def _is_due(self, starts_at, now):
+        return starts_at - self.lead_time <= now < starts_at
+
+    def _already_reminded(self, event, speech, starts_at):
+        # Напоминание уже ушло (вручную из админки или до перезапуска)
+        return Notification.objects.filter(
+            event=event,
+            speech=speech,
+            notification_type='reminder',
+            created_at__gte=starts_at - self.lead_time,
+        ).exists()
+
+
+_scheduler = None
+
+
+def start_reminder_scheduler():
+    global _scheduler
+    minutes = settings.NOTIFICATION_SETTINGS["reminder_minutes_before"]
+    _scheduler = ReminderScheduler(
+        lead_time=timedelta(minutes=minutes),
+        version_check_interval=settings.BOT_SETTINGS["program_version_check_seconds"],
+    )
+    _scheduler.load()
+
+    thread = threading.Thread(target=_scheduler.run, name="reminder-scheduler", daemon=True)
+    thread.start()
+    return _scheduler
+
+
+def notify_event_changed(event_id):
+    """
+    Сообщает планировщику этого процесса, что программа мероприятия изменилась.
+    Планировщик в другом процессе увидит изменение по новой версии программы.
+    """
+    if _scheduler is None:
+        return
+    try:
+        _scheduler.reindex_event(event_id)
+    except Exception as e:
+        logger.error(f"Error reindexing reminders for event {event_id}: {e}")
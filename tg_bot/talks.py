@@ -1,9 +1,19 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, CallbackQueryHandler
 
 from datacenter.models import Event, Speech, Speaker, Participant, Question, Subscription
 from .notifications import get_notification_service
+from .program import find_active_speech, get_program, is_speech_scheduled_today
+from .questions import MESSAGE_MAX_LENGTH, format_question, get_question_buffer
+from .votes import get_vote_counter
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
 
 def start_ask_question(update: Update, context: CallbackContext) -> None:
@@ -43,19 +53,15 @@ def handle_question_if_waiting(
         return True
 
     try:
-        participant, created = Participant.objects.get_or_create(
-            telegram_id=user.id,
-            defaults={
-                "username": user.username,
-                "full_name": f"{user.first_name} {user.last_name or ''}".strip()
-            }
-        )
-        speech = Speech.objects.get(id=speech_id)
-        question = Question.objects.create(
-            speech=speech,
-            participant=participant,
-            question_text=question_text
-        )
+        if not is_speech_scheduled_today(speech_id):
+            # Выступление удалили или перенесли, пока человек писал вопрос
+            update.message.reply_text("Ошибка: выступление не найдено")
+            context.user_data["awaiting_question"] = False
+            context.user_data.pop("active_speech_id", None)
+            return True
+
+        # Ответ не ждёт записи в БД: вопрос уже в журнале буфера и попадёт в БД пачкой
+        get_question_buffer().submit(speech_id, user, question_text)
 
         print(f"[QUESTION] from {user.id} (@{user.username}): {question_text}")
 
@@ -66,10 +72,7 @@ def handle_question_if_waiting(
             "Спасибо! Я передал твой вопрос спикеру.\n"
             "Можешь задать ещё один или вернуться к программе/нетворкингу через меню."
         )
-    
-    except Speech.DoesNotExist:
-        update.message.reply_text("Ошибка: выступление не найдено")
-        context.user_data["awaiting_question"] = False
+
     except Exception as e:
         print(f"Error saving question: {e}")
         update.message.reply_text(
@@ -78,75 +81,110 @@ def handle_question_if_waiting(
     return True
 
 
-def _format_time(dt):
-    if not dt:
-        return "Не указано"
-    local_dt = timezone.localtime(dt)
-    return local_dt.strftime("%H:%M")
+def show_live_questions(update: Update, context: CallbackContext) -> None:
+    speech = get_active_speech()
+    if not speech:
+        update.message.reply_text(
+            "В данный момент нет активных выступлений.\n"
+            "Голосовать за вопросы можно только во время выступления спикера."
+        )
+        return
+
+    text, reply_markup = _render_live_questions(speech)
+    update.message.reply_text(text, reply_markup=reply_markup)
+
+
+def handle_vote_callback(update: Update, context: CallbackContext) -> None:
+    query = update.callback_query
+
+    # vote_{speech_id}_{question_id}
+    _, speech_id, question_id = query.data.split("_")
+    speech = get_active_speech()
+    if not speech or speech.id != int(speech_id):
+        query.answer("Выступление уже закончилось, голосование закрыто")
+        return
+
+    if not get_vote_counter().vote(speech.id, int(question_id), update.effective_user.id):
+        query.answer("Ты уже голосовал за этот вопрос")
+        return
+
+    query.answer("Голос учтён")
+    text, reply_markup = _render_live_questions(speech)
+    query.edit_message_text(text, reply_markup=reply_markup)
 
 
-def _format_datetime(dt):
+def _render_live_questions(speech):
+    questions = list(
+        Question.objects.filter(speech=speech, duplicate_of__isnull=True)
+        .order_by("-votes", "created_at", "id")[:settings.BOT_SETTINGS["live_questions_count"]]
+    )
+    if not questions:
+        return f"К докладу «{speech.title}» пока нет вопросов.", None
+
+    # Голоса, ещё не записанные в БД, тоже показываем
+    pending = get_vote_counter().pending_votes({question.id for question in questions})
+
+    header = f"Вопросы к докладу «{speech.title}».\nГолосуй за те, что хочешь услышать:\n\n"
+    max_length = (MESSAGE_MAX_LENGTH - len(header)) // len(questions) - 2
+    lines = []
+    keyboard = []
+    for index, question in enumerate(questions, start=1):
+        votes = question.votes + pending.get(question.id, 0)
+        line = f"{index}. {question.question_text}"
+        if len(line) > max_length:
+            line = line[:max_length - 1] + "…"
+        lines.append(line)
+        keyboard.append([InlineKeyboardButton(
+            f"▲ {index} · {votes}", callback_data=f"vote_{speech.id}_{question.id}"
+        )])
+
+    return header + "\n\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+
+def _format_time(dt):
     if not dt:
         return "Не указано"
     local_dt = timezone.localtime(dt)
-    return local_dt.strftime("%d.%m.%Y %H:%M")
+    return local_dt.strftime("%H:%M")
 
 
 def show_schedule(update: Update, context: CallbackContext) -> None:
     try:
-        # Получаем все активные мероприятия
-        active_events = Event.objects.filter(is_active=True).order_by('date')
-        if not active_events.exists():
+        # Программа берётся из кэша, заново считается только статус выступлений
+        program = get_program()
+        if not program["has_events"]:
             update.message.reply_text("В данный момент нет активных событий")
             return
 
-        # Получаем все выступления из всех активных мероприятий
-        speeches = Speech.objects.filter(
-            event__in=active_events
-        ).select_related("speaker", "event").order_by("start_time")
-
-        if not speeches.exists():
+        if not program["speeches"]:
             update.message.reply_text(
                 "Программа выступлений пока не доступна"
             )
             return
 
         # Группируем выступления по мероприятиям
-        schedule_text = ""
-        current_event = None
-        
-        for speech in speeches:
+        parts = []
+        current_event_id = None
+        now = timezone.now()
+
+        for speech in program["speeches"]:
             # Если это новое мероприятие, добавляем заголовок
-            if current_event != speech.event:
-                current_event = speech.event
-                if schedule_text:
-                    schedule_text += "\n"
-                schedule_text += f"Программа: {current_event.title}\n\n"
-
-            now = timezone.now()
-            if speech.start_time <= now <= speech.end_time:
+            if current_event_id != speech["event_id"]:
+                current_event_id = speech["event_id"]
+                if parts:
+                    parts.append("\n")
+                parts.append(f"Программа: {speech['event_title']}\n\n")
+
+            if speech["start_time"] <= now <= speech["end_time"]:
                 status = "Сейчас"
-            elif now < speech.start_time:
+            elif now < speech["start_time"]:
                 status = "Будет"
             else:
                 status = "Завершено"
-            
-            # Форматируем время: если начало и конец в один день, показываем дату только для начала
-            start_local = timezone.localtime(speech.start_time)
-            end_local = timezone.localtime(speech.end_time)
-            
-            if start_local.date() == end_local.date():
-                # Оба времени в один день - показываем дату только для начала
-                time_range = f"{_format_datetime(speech.start_time)}-{end_local.strftime('%H:%M')}"
-            else:
-                # Разные дни - показываем дату для обоих
-                time_range = f"{_format_datetime(speech.start_time)}-{_format_datetime(speech.end_time)}"
-            
-            schedule_text += f"{status}, {time_range}\n"
-            schedule_text += f"спикер - {speech.speaker.name}\n"
-            schedule_text += f"тема: {speech.title}\n\n"
 
-        update.message.reply_text(schedule_text)
+            parts.append(f"{status}, {speech['text']}")
+
+        update.message.reply_text("".join(parts))
 
     except Exception as e:
         print(f"Error showing schedule: {e}")
@@ -155,12 +193,8 @@ def show_schedule(update: Update, context: CallbackContext) -> None:
 
 def get_active_speech():
     try:
-        now = timezone.now()
-        return Speech.objects.filter(
-            start_time__lte=now,
-            end_time__gte=now,
-            # is_active=True   ## нет необходимости, определяется автоматом
-        ).select_related("speaker").first()
+        # Индекс сегодняшних выступлений в памяти, БД трогаем только при его перестройке
+        return find_active_speech()
     except Exception as e:
         print(f"Error getting active speech: {e}")
         return None
@@ -201,40 +235,144 @@ def show_speaker_questions(update: Update, context: CallbackContext) -> None:
         )
         return
 
-    questions = (
-        Question.objects.filter(speech=speech)
-        .select_related("participant")
-        .order_by("created_at")
-    )
+    questions, has_next = _fetch_questions_page(speech, "next", None)
 
-    if not questions.exists():
+    if not questions:
         update.message.reply_text(
             f"К докладу «{speech.title}» пока нет вопросов.\n"
             "Можешь открыть бот ещё раз позже, они появятся к концу выступления."
         )
         return
 
+    text, reply_markup = _render_questions_page(speech, questions, 0, False, has_next)
+    update.message.reply_text(text, reply_markup=reply_markup)
+
+
+def handle_speaker_questions_callback(update: Update, context: CallbackContext) -> None:
+    query = update.callback_query
+    query.answer()
+
+    direction, speech_id, offset, cursor = _parse_questions_cursor_data(query.data)
+
+    speech = Speech.objects.filter(
+        id=speech_id, speaker__telegram_id=update.effective_user.id
+    ).first()
+    if not speech:
+        query.edit_message_text("Выступление не найдено")
+        return
+
+    questions, has_more = _fetch_questions_page(speech, direction, cursor)
+    if not questions:
+        return
+
+    if direction == "next":
+        has_prev, has_next = True, has_more
+    else:
+        offset -= len(questions)
+        has_prev, has_next = has_more, True
+
+    text, reply_markup = _render_questions_page(speech, questions, offset, has_prev, has_next)
+    query.edit_message_text(text, reply_markup=reply_markup)
+
+
+def _fetch_questions_page(speech, direction, cursor):
+    """
+    Одна страница вопросов по ключу (-votes, created_at, id) без OFFSET: сначала самые
+    популярные, при равенстве — по времени. Вперёд — после cursor, назад — перед ним.
+    Возвращает вопросы и признак, что дальше есть ещё.
+    """
+    page_size = settings.BOT_SETTINGS["speaker_questions_page_size"]
+    # Почти одинаковые вопросы показываем один раз, с числом похожих
+    questions = Question.objects.filter(
+        speech=speech, duplicate_of__isnull=True
+    ).select_related("participant")
+
+    if direction == "next":
+        if cursor:
+            votes, created_at, question_id = cursor
+            questions = questions.filter(
+                Q(votes__lt=votes)
+                | Q(votes=votes, created_at__gt=created_at)
+                | Q(votes=votes, created_at=created_at, id__gt=question_id)
+            )
+        questions = questions.order_by("-votes", "created_at", "id")
+    else:
+        votes, created_at, question_id = cursor
+        questions = questions.filter(
+            Q(votes__gt=votes)
+            | Q(votes=votes, created_at__lt=created_at)
+            | Q(votes=votes, created_at=created_at, id__lt=question_id)
+        ).order_by("votes", "-created_at", "-id")
+
+    page = list(questions[:page_size + 1])
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    if direction == "prev":
+        page.reverse()
+    return page, has_more
+
+
+def _questions_cursor_data(direction, speech, offset, question):
+    created_at = (question.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f"questions_{direction}_{speech.id}_{offset}_{question.votes}_{created_at}_{question.id}"
+
+
+def _parse_questions_cursor_data(data):
+    # questions_{next|prev}_{speech_id}_{offset}_{votes}_{created_at в микросекундах}_{question_id}
+    _, direction, speech_id, offset, votes, created_at, question_id = data.split("_")
+    cursor = (int(votes), _EPOCH + timedelta(microseconds=int(created_at)), int(question_id))
+    return direction, int(speech_id), int(offset), cursor
+
+
+def _render_questions_page(speech, questions, offset, has_prev, has_next):
     header = (
         f"Вопросы к твоему докладу:\n"
         f"«{speech.title}»\n\n"
     )
 
+    # Страница целиком должна влезть в одно сообщение Telegram
+    max_length = (MESSAGE_MAX_LENGTH - len(header)) // len(questions) - 2
     lines = []
-    for index, question in enumerate(questions, start=1):
-        participant = question.participant
-        username = participant.username or "ник не указан"
-        name = participant.full_name or username
+    for index, question in enumerate(questions, start=offset + 1):
+        line = f"{index}. {format_question(question)}"
+        if len(line) > max_length:
+            line = line[:max_length - 2] + "…\n"
+        lines.append(line)
+
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            "← Назад", callback_data=_questions_cursor_data("prev", speech, offset, questions[0])
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            "Дальше →",
+            callback_data=_questions_cursor_data("next", speech, offset + len(questions), questions[-1]),
+        ))
+    reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+
+    return header + "\n".join(lines), reply_markup
+
+
+def toggle_questions_push(update: Update, context: CallbackContext) -> None:
+    speaker = Speaker.objects.filter(telegram_id=update.effective_user.id).first()
+    if not speaker:
+        update.message.reply_text("Эта команда доступна только спикерам.")
+        return
 
-        contact = f"@{username}" if participant.username else "контакт: ник не указан"
+    enabled = not speaker.questions_push_enabled
+    Speaker.objects.filter(id=speaker.id).update(questions_push_enabled=enabled)
 
-        lines.append(
-            f"{index}. От {name} ({contact}):\n"
-            f"   {question.question_text}\n"
+    if enabled:
+        update.message.reply_text(
+            "Буду присылать новые вопросы к твоему текущему докладу пачками, "
+            "как только они появятся.\n"
+            "Отключить — /push_questions ещё раз."
+        )
+    else:
+        update.message.reply_text(
+            "Больше не присылаю вопросы сам. Их всегда можно посмотреть через «Мои вопросы»."
         )
-
-    text = header + "\n".join(lines)
-
-    update.message.reply_text(text)
 
 
 def subscribe_to_next_events(update: Update, context: CallbackContext) -> None:
@@ -296,6 +434,9 @@ def _subscribe_to_event(update: Update, context: CallbackContext, event_id: int)
             "full_name": f"{user.first_name} {user.last_name or ''}".strip(),
         },
     )
+    if participant.bot_blocked:
+        participant.bot_blocked = False
+        participant.save(update_fields=['bot_blocked'])
 
     subscription, created = Subscription.objects.get_or_create(
         participant=participant,
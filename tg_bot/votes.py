@@ -0,0 +1,138 @@
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+from datacenter.models import Question, QuestionVote
+
+
+logger = logging.getLogger(__name__)
+
+
+class VoteCounter:
+    """
+    Голоса за вопросы копятся в памяти и раз в flush_interval секунд уходят в БД:
+    строки QuestionVote одним bulk_create, а затем одним UPDATE счётчик votes
+    затронутых вопросов пересчитывается по этим строкам. Повторный голос, который
+    bulk_create отбросил по unique_together, счёт не увеличит.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        # Кто уже голосовал: поднимается из БД один раз на выступление
+        self.voters = defaultdict(set)
+        self.loaded_speeches = set()
+        self.pending = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def vote(self, speech_id, question_id, telegram_id):
+        """Возвращает False, если этот пользователь уже голосовал за вопрос."""
+        if speech_id not in self.loaded_speeches:
+            self._load_voters(speech_id)
+
+        with self.lock:
+            voters = self.voters[question_id]
+            if telegram_id in voters:
+                return False
+            voters.add(telegram_id)
+            self.pending.append((question_id, telegram_id, timezone.now()))
+            return True
+
+    def pending_votes(self, question_ids):
+        """Голоса, которые ещё не записаны в БД, чтобы показывать актуальный счёт."""
+        with self.lock:
+            counts = defaultdict(int)
+            for question_id, _, _ in self.pending:
+                if question_id in question_ids:
+                    counts[question_id] += 1
+            return counts
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="question-votes", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            votes, self.pending = self.pending, []
+        if not votes:
+            return 0
+
+        question_ids = {question_id for question_id, _, _ in votes}
+        vote_counts = (
+            QuestionVote.objects.filter(question=OuterRef('pk'))
+            .values('question')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+
+        try:
+            with transaction.atomic():
+                # Вопрос могли удалить, пока голос ждал записи: такой голос выбрасываем,
+                # иначе внешний ключ уронит всю пачку. Блокировка не даст удалить вопрос до коммита
+                existing = set(
+                    Question.objects.select_for_update()
+                    .filter(id__in=question_ids)
+                    .values_list('id', flat=True)
+                )
+                QuestionVote.objects.bulk_create(
+                    [
+                        QuestionVote(question_id=question_id, telegram_id=telegram_id, created_at=created_at)
+                        for question_id, telegram_id, created_at in votes
+                        if question_id in existing
+                    ],
+                    ignore_conflicts=True,
+                )
+                Question.objects.filter(id__in=existing).update(votes=Subquery(vote_counts))
+        except Exception:
+            with self.lock:
+                self.pending = votes + self.pending
+            raise
+        return sum(question_id in existing for question_id, _, _ in votes)
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing question votes: {e}")
+
+    def _load_voters(self, speech_id):
+        voters = list(
+            QuestionVote.objects.filter(question__speech_id=speech_id)
+            .values_list('question_id', 'telegram_id')
+        )
+
+        with self.lock:
+            if speech_id in self.loaded_speeches:
+                return
+            for question_id, telegram_id in voters:
+                self.voters[question_id].add(telegram_id)
+            self.loaded_speeches.add(speech_id)
+
+
+_vote_counter = None
+_vote_counter_lock = threading.Lock()
+
+
+def get_vote_counter():
+    global _vote_counter
+    with _vote_counter_lock:
+        if _vote_counter is None:
+            _vote_counter = VoteCounter(
+                flush_interval=settings.BOT_SETTINGS["question_votes_flush_seconds"],
+            )
+            _vote_counter.start()
+        return _vote_counter
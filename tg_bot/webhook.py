@@ -0,0 +1,108 @@
+import json
+import logging
+import threading
+
+from django.db import close_old_connections
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from datacenter.models import TelegramUpdate
+
+
+logger = logging.getLogger(__name__)
+
+# Группы обработчиков диспетчер проходит по возрастанию, эта — последняя
+PROCESSED_GROUP = 1000
+
+
+class WebhookUpdateFeed:
+    """
+    Передаёт диспетчеру runbot апдейты, которые webhook веб-приложения сложил в TelegramUpdate.
+
+    Веб-воркеры только проверяют секрет и пишут апдейт в таблицу, поэтому их можно
+    запускать сколько угодно. Обрабатывает апдейты один процесс runbot: состояния
+    диалогов, журнал вопросов, голоса, нетворкинг и лимит сообщений живут в нём одном.
+
+    Строку из таблицы удаляем только после того, как её апдейт обработан: если процесс
+    упадёт, необработанные апдейты останутся в таблице и будут забраны после перезапуска.
+    """
+
+    def __init__(self, dispatcher, poll_interval, idle_poll_interval, batch_size):
+        self.dispatcher = dispatcher
+        self.poll_interval = poll_interval
+        self.idle_poll_interval = idle_poll_interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+        # Переданы диспетчеру, но ещё лежат в таблице: повторно их не берём
+        self.pending = set()
+        # Обработаны диспетчером, строки можно удалять
+        self.processed = []
+        self.lock = threading.Lock()
+        # Telegram шлёт апдейты в webhook параллельно, поэтому id в таблице
+        # могут появляться не по порядку — отмечаем каждый апдейт, а не последний
+        dispatcher.add_handler(TypeHandler(Update, self._mark_processed), group=PROCESSED_GROUP)
+
+    def run(self):
+        interval = self.poll_interval
+        while not self.stopped.is_set():
+            close_old_connections()
+            try:
+                received = self.poll()
+            except Exception as e:
+                logger.error(f"Error reading webhook updates: {e}")
+                received = 0
+            # Полная пачка — в таблице наверняка есть ещё, забираем без паузы
+            if received >= self.batch_size:
+                continue
+            # Пока апдейтов нет и нечего подтверждать, опрашиваем таблицу всё реже
+            if received or self.pending:
+                interval = self.poll_interval
+            else:
+                interval = min(interval * 2, self.idle_poll_interval)
+            self.stopped.wait(interval)
+
+    def stop(self):
+        self.stopped.set()
+
+    def poll(self):
+        self.delete_processed()
+        # Диспетчер не успевает — не набираем ему очередь, пока не разберёт эту
+        if len(self.pending) >= self.batch_size:
+            return 0
+
+        rows = list(
+            TelegramUpdate.objects.exclude(update_id__in=self.pending)
+            .order_by('update_id')
+            .values_list('update_id', 'payload')[:self.batch_size]
+        )
+        broken = []
+        for update_id, payload in rows:
+            try:
+                update = Update.de_json(json.loads(payload), self.dispatcher.bot)
+            except Exception as e:
+                logger.warning(f"Skipping broken webhook update {update_id}: {e}")
+                broken.append(update_id)
+                continue
+            self.pending.add(update_id)
+            self.dispatcher.update_queue.put(update)
+
+        if broken:
+            TelegramUpdate.objects.filter(update_id__in=broken).delete()
+        return len(rows)
+
+    def delete_processed(self, everything=False):
+        """
+        Удаляет строки обработанных апдейтов. everything — после остановки диспетчера:
+        он разбирает очередь до конца, так что обработано всё, что ему передали.
+        """
+        with self.lock:
+            done, self.processed = self.processed, []
+        if everything:
+            done = list(self.pending)
+        if done:
+            TelegramUpdate.objects.filter(update_id__in=done).delete()
+            self.pending.difference_update(done)
+
+    def _mark_processed(self, update, context):
+        with self.lock:
+            self.processed.append(update.update_id)